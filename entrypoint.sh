@@ -2,6 +2,16 @@
 set -e
 
 python manage.py migrate --noinput
-python manage.py collectstatic --noinput
+# Las versiones completas de Font Awesome y animate.css las reemplaza users/dist
+# (construir_activos). Solo se dejan fuera si de verdad se usa lo reducido: con
+# ACTIVOS_REDUCIDOS=False o sin manifiesto, {% activo %} enlaza las originales.
+reducidos=$(echo "${ACTIVOS_REDUCIDOS:-True}" | tr '[:upper:]' '[:lower:]')
+if [ "$reducidos" = "true" ] && [ -f users/static/users/dist/manifiesto.json ]; then
+    python manage.py collectstatic --noinput \
+        --ignore 'users/fontawesome/*' --ignore 'users/webfonts/*' \
+        --ignore 'users/css/all.min.css' --ignore 'users/css/fontawesome*.css' --ignore 'users/css/animate*.css'
+else
+    python manage.py collectstatic --noinput
+fi
 
 exec "$@"
@@ -151,6 +151,14 @@ LOGIN_URL = '/login/'
 
 AUTH_USER_MODEL = 'users.Usuario'  # Asegúrate que la app se llama 'users'
 
+# Usuario de la sesión en caché (users.autenticacion). ModelBackend sigue en la
+# lista para que las sesiones iniciadas antes de activarlo no se cierren.
+USUARIOS_EN_CACHE = os.environ.get('USUARIOS_EN_CACHE', 'False').lower() == 'true'
+USUARIOS_CACHE_SEGUNDOS = int(os.environ.get('USUARIOS_CACHE_SEGUNDOS', '300'))
+AUTHENTICATION_BACKENDS = (
+    ['users.autenticacion.BackendConCache'] if USUARIOS_EN_CACHE else []
+) + ['django.contrib.auth.backends.ModelBackend']
+
 
 # Tiempo de vida de la sesión (en segundos)
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 días
@@ -158,9 +166,92 @@ SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 días
 # Mantener sesión aunque se cierre el navegador
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Sesiones en el caché 'sesiones' con respaldo en la base de datos (users.sesiones)
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'users.sesiones')
+SESSION_CACHE_ALIAS = 'sesiones'
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
 ERROR_403_TEMPLATE = 'users/error_403.html'
+
+
+# Vida de las reservas en carrito (boletos y paquetes), en minutos
+CARRITO_TTL_MINUTOS = int(os.environ.get('CARRITO_TTL_MINUTOS', '30'))
+
+# Filas liberadas por transacción al limpiar carritos vencidos
+CARRITO_LIMPIEZA_LOTE = int(os.environ.get('CARRITO_LIMPIEZA_LOTE', '500'))
+
+# Segundos entre pasadas de liberar_carritos si no se indica --cada (0 = una sola pasada)
+CARRITO_LIMPIEZA_INTERVALO = int(os.environ.get('CARRITO_LIMPIEZA_INTERVALO', '0'))
+
+# Los horarios nuevos crean sus boletos al reservarse en lugar de todos de una vez
+BOLETOS_PEREZOSOS = os.environ.get('BOLETOS_PEREZOSOS', 'False').lower() == 'true'
+
+# Registro de eventos de boletos, paquetes, pagos y ventas (users.eventos)
+EVENTOS_ACTIVOS = os.environ.get('EVENTOS_ACTIVOS', 'True').lower() == 'true'
+EVENTOS_ARCHIVO = os.environ.get('EVENTOS_ARCHIVO', os.path.join(BASE_DIR, 'logs', 'eventos.jsonl'))
+EVENTOS_AUDITORIA_BD = os.environ.get('EVENTOS_AUDITORIA_BD', 'False').lower() == 'true'
+EVENTOS_LOTE = 200
+EVENTOS_INTERVALO = 1.0
+
+# Autocompletado de usuarios en list_users: resultados y tiempo máximo de la consulta (PostgreSQL)
+AUTOCOMPLETAR_LIMITE = int(os.environ.get('AUTOCOMPLETAR_LIMITE', '10'))
+AUTOCOMPLETAR_TIMEOUT_MS = int(os.environ.get('AUTOCOMPLETAR_TIMEOUT_MS', '200'))
+
+# Caché por proceso de cédulas, teléfonos y correos vistos libres en verificar_datos
+UNICIDAD_CACHE_SEGUNDOS = int(os.environ.get('UNICIDAD_CACHE_SEGUNDOS', '60'))
+UNICIDAD_CACHE_MAX = 10000
+
+# Caché en disco de las facturas PDF (users.facturas)
+FACTURAS_CACHE_DIR = os.environ.get('FACTURAS_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'facturas'))
+FACTURAS_CACHE_MAX_BYTES = int(os.environ.get('FACTURAS_CACHE_MAX_MB', '500')) * 1024 * 1024
+FACTURAS_CACHE_MAX_DIAS = int(os.environ.get('FACTURAS_CACHE_MAX_DIAS', '30'))
+FACTURAS_CACHE_PODA_SEGUNDOS = 300
+
+# Procesos que convierten facturas a PDF fuera de la petición (0 = en la petición),
+# segundos tras los que un trabajo pendiente se da por perdido y si se generan al comprar
+FACTURAS_PROCESOS = int(os.environ.get('FACTURAS_PROCESOS', '2'))
+FACTURAS_TRABAJO_TIMEOUT = int(os.environ.get('FACTURAS_TRABAJO_TIMEOUT', '120'))
+FACTURAS_PRERENDER = os.environ.get('FACTURAS_PRERENDER', 'True').lower() == 'true'
+# Segundos que se informa el error de una factura fallida antes de permitir otro intento
+FACTURAS_REINTENTO_SEGUNDOS = int(os.environ.get('FACTURAS_REINTENTO_SEGUNDOS', '300'))
+
+# Variantes redimensionadas de las imágenes de los destinos (users.imagenes): anchos en píxeles y calidad
+IMAGENES_ANCHOS = [int(ancho) for ancho in os.environ.get('IMAGENES_ANCHOS', '320,640,1024').split(',')]
+IMAGENES_CALIDAD = int(os.environ.get('IMAGENES_CALIDAD', '80'))
+
+# Envío de los archivos de MEDIA_ROOT (users.medios): '' (FileResponse), 'x-accel-redirect' (nginx)
+# o 'x-sendfile' (Apache/lighttpd), y ubicación interna de nginx que apunta a MEDIA_ROOT
+MEDIOS_ENVIO = os.environ.get('MEDIOS_ENVIO', '').lower()
+MEDIOS_PREFIJO_INTERNO = os.environ.get('MEDIOS_PREFIJO_INTERNO', '/media-interno/')
+
+# Enlazar las hojas de estilo reducidas por construir_activos (users.activos) en lugar de las originales
+ACTIVOS_REDUCIDOS = os.environ.get('ACTIVOS_REDUCIDOS', 'True').lower() == 'true'
+
+# Caché compartido por los workers de gunicorn (versión del catálogo y fragmentos de users.catalogo).
+# Con Redis: CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y CACHE_LOCATION=redis://host:6379
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'django')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Aparte, para que las sesiones no desplacen a los fragmentos del catálogo (ni al revés):
+    # no hereda CACHE_LOCATION, y con Redis conviene otra base (redis://host:6379/1)
+    'sesiones': {
+        'BACKEND': os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'sesiones')),
+        'KEY_PREFIX': 'sesiones',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Duración máxima de los fragmentos del catálogo (también el retraso máximo de los boletos disponibles)
+CATALOGO_CACHE_SEGUNDOS = int(os.environ.get('CATALOGO_CACHE_SEGUNDOS', '60'))
+
+# Retraso máximo de los totales de ventas del panel de administración
+KPIS_CACHE_SEGUNDOS = int(os.environ.get('KPIS_CACHE_SEGUNDOS', '30'))
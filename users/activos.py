@@ -0,0 +1,293 @@
+"""Versión reducida de las hojas de estilo y fuentes de users/static.
+
+`construir` recorre users/templates y, para cada hoja de estilos que enlaza
+una plantilla, deja solo las reglas cuyas clases aparecen en las plantillas
+que la usan (o en los scripts de users/static/users/js), las animaciones
+@keyframes que esas reglas nombran y las @font-face de las familias que siguen
+en uso. Las fuentes se recortan con fontTools a los caracteres que aparecen en
+las reglas conservadas (los íconos de Font Awesome que de verdad se usan) y se
+guardan solo en WOFF2.
+
+Todo queda minificado en users/static/users/dist/ con el hash del contenido en
+el nombre, junto con manifiesto.json, que relaciona cada hoja original con su
+versión reducida. La etiqueta {% activo %} (users/templatetags/activos.py) usa
+ese manifiesto y, si no existe, enlaza la hoja original.
+"""
+import hashlib
+import io
+import json
+import posixpath
+import re
+import shutil
+from pathlib import Path
+
+import tinycss2
+
+APP = Path(__file__).resolve().parent
+PLANTILLAS = APP / 'templates'
+ESTATICOS = APP / 'static'
+SCRIPTS = ESTATICOS / 'users' / 'js'
+DESTINO = 'users/dist'
+MANIFIESTO = ESTATICOS / DESTINO / 'manifiesto.json'
+
+_ENLACE = re.compile(r'<link\b[^>]*>')
+_HOJA = re.compile(r'''\{%\s*(?:static|activo)\s+['"]([^'"]+\.css)['"]\s*%\}''')
+_PALABRA = re.compile(r'[A-Za-z_][\w-]*')
+_ANIMACION = {'animation', 'animation-name', '-webkit-animation', '-webkit-animation-name'}
+_KEYFRAMES = {'keyframes', '-webkit-keyframes', '-moz-keyframes'}
+_ANIDADAS = {'media', 'supports', 'layer', 'document', '-moz-document'}
+# Sin espacios alrededor de estos signos el CSS significa lo mismo
+_SIN_ESPACIO = {',', '>', '~', ';', '{', '}'}
+
+
+def _texto(tokens):
+    """Serializa `tokens` sin comentarios y con el mínimo de espacios."""
+    partes = []
+    espacio = False
+    for token in tokens:
+        if token.type == 'comment':
+            continue
+        if token.type == 'whitespace':
+            espacio = bool(partes)
+            continue
+        if token.type == 'function':
+            texto = f"{tinycss2.serializer.serialize_identifier(token.name)}({_texto(token.arguments)})"
+        elif token.type in ('() block', '[] block', '{} block'):
+            texto = f"{token.type[0]}{_texto(token.content)}{token.type[1]}"
+        else:
+            texto = tinycss2.serialize([token])
+        if espacio and partes[-1] not in _SIN_ESPACIO and texto not in _SIN_ESPACIO:
+            partes.append(' ')
+        partes.append(texto)
+        espacio = False
+    return ''.join(partes)
+
+
+def _declaraciones(contenido):
+    return [
+        d for d in tinycss2.parse_blocks_contents(contenido, skip_comments=True, skip_whitespace=True)
+        if d.type == 'declaration'
+    ]
+
+
+def _bloque(declaraciones):
+    return '{' + ';'.join(
+        f"{d.name}:{_texto(d.value)}{'!important' if d.important else ''}" for d in declaraciones
+    ) + '}'
+
+
+def _selectores(preludio):
+    """Lista de selectores de `preludio`, cada uno como lista de tokens."""
+    selectores = [[]]
+    for token in preludio:
+        if token.type == 'literal' and token.value == ',':
+            selectores.append([])
+        else:
+            selectores[-1].append(token)
+    return selectores
+
+
+def _clases(selector):
+    """Clases del nivel superior de `selector`; las de :not(), :is()… no cuentan."""
+    return {
+        siguiente.value
+        for token, siguiente in zip(selector, selector[1:])
+        if token.type == 'literal' and token.value == '.' and siguiente.type == 'ident'
+    }
+
+
+def _cadenas(tokens):
+    for token in tokens:
+        if token.type == 'string':
+            yield token.value
+        elif token.type == 'function':
+            yield from _cadenas(token.arguments)
+        elif token.type.endswith('block'):
+            yield from _cadenas(token.content)
+
+
+class _Hoja:
+    """Una hoja de estilos reducida a las clases de `usadas`."""
+
+    def __init__(self, ruta, usadas):
+        self.ruta = ruta
+        self.usadas = usadas
+        self.animaciones = set()
+        self.cadenas = set()
+        reglas = tinycss2.parse_stylesheet(ruta.read_text(encoding='utf-8'), skip_comments=True, skip_whitespace=True)
+        self.reglas = self._filtrar(reglas)
+
+    def _filtrar(self, reglas):
+        """Primera pasada: reglas de estilo con sus selectores en uso."""
+        conservadas = []
+        for regla in reglas:
+            if regla.type == 'qualified-rule':
+                selectores = [
+                    s for s in _selectores(regla.prelude) if _clases(s) <= self.usadas
+                ]
+                if not selectores:
+                    continue
+                declaraciones = _declaraciones(regla.content)
+                for declaracion in declaraciones:
+                    if declaracion.lower_name in _ANIMACION:
+                        self.animaciones.update(t.value for t in declaracion.value if t.type == 'ident')
+                    self.cadenas.update(_cadenas(declaracion.value))
+                conservadas.append(('estilo', selectores, declaraciones))
+            elif regla.type == 'at-rule' and regla.lower_at_keyword in _ANIDADAS and regla.content is not None:
+                internas = self._filtrar(tinycss2.parse_rule_list(regla.content, skip_comments=True, skip_whitespace=True))
+                if internas:
+                    conservadas.append(('anidada', regla, internas))
+            elif regla.type == 'at-rule':
+                conservadas.append(('arroba', regla, None))
+        return conservadas
+
+    def css(self, fuente_recortada):
+        return ''.join(self._css(self.reglas, fuente_recortada))
+
+    def _css(self, reglas, fuente_recortada):
+        for tipo, regla, resto in reglas:
+            if tipo == 'estilo':
+                yield ','.join(_texto(s) for s in regla) + _bloque(resto)
+            elif tipo == 'anidada':
+                interno = ''.join(self._css(resto, fuente_recortada))
+                yield f"@{regla.at_keyword} {_texto(regla.prelude)}{{{interno}}}"
+            elif regla.lower_at_keyword in _KEYFRAMES:
+                nombre = _texto(regla.prelude)
+                if nombre in self.animaciones:
+                    pasos = ''.join(
+                        _texto(paso.prelude) + _bloque(_declaraciones(paso.content))
+                        for paso in tinycss2.parse_rule_list(regla.content, skip_comments=True, skip_whitespace=True)
+                        if paso.type == 'qualified-rule'
+                    )
+                    yield f"@{regla.at_keyword} {nombre}{{{pasos}}}"
+            elif regla.lower_at_keyword == 'font-face':
+                css = self._fuente(regla, fuente_recortada)
+                if css:
+                    yield css
+            else:
+                contenido = '{' + _texto(regla.content) + '}' if regla.content is not None else ';'
+                yield f"@{regla.at_keyword} {_texto(regla.prelude)}".rstrip() + contenido
+
+    def _fuente(self, regla, fuente_recortada):
+        """@font-face con solo la WOFF2 recortada; None si su familia ya no se usa."""
+        declaraciones = _declaraciones(regla.content)
+        familia = next(
+            (''.join(_cadenas(d.value)) or _texto(d.value) for d in declaraciones if d.lower_name == 'font-family'),
+            None,
+        )
+        if familia not in self.cadenas:
+            return None
+        resultado = []
+        for declaracion in declaraciones:
+            if declaracion.lower_name != 'src':
+                resultado.append(f"{declaracion.name}:{_texto(declaracion.value)}")
+                continue
+            urls = [t.value for t in declaracion.value if t.type == 'url']
+            urls += [
+                ''.join(_cadenas(t.arguments)) for t in declaracion.value
+                if t.type == 'function' and t.lower_name == 'url'
+            ]
+            woff2 = next((u for u in urls if u.split('?')[0].endswith('.woff2')), None)
+            if woff2 is None:
+                return None
+            nombre = fuente_recortada(self.ruta.parent / woff2.split('?')[0].split('#')[0])
+            resultado.append(f'src:url({nombre}) format("woff2")')
+        return '@font-face{' + ';'.join(resultado) + '}'
+
+    def caracteres(self):
+        """Caracteres que las reglas conservadas pueden pintar con una fuente de íconos."""
+        return {ord(c) for cadena in self.cadenas for c in cadena}
+
+
+def _ascii(css):
+    """Escapa lo que no es ASCII (los íconos), para no depender del charset con que se sirva."""
+    return re.sub(r'[^\x00-\x7e]', lambda m: '\\%x ' % ord(m[0]), css)
+
+
+def _con_hash(nombre, contenido):
+    raiz, extension = posixpath.splitext(nombre)
+    return f"{raiz}.{hashlib.sha256(contenido).hexdigest()[:8]}{extension}"
+
+
+def _recortar(origen, caracteres):
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    opciones = subset.Options()
+    opciones.flavor = 'woff2'
+    opciones.layout_features = ['*']
+    opciones.notdef_outline = True
+    fuente = TTFont(origen, recalcTimestamp=False)
+    recortador = subset.Subsetter(opciones)
+    recortador.populate(unicodes=caracteres)
+    recortador.subset(fuente)
+    salida = io.BytesIO()
+    fuente.flavor = 'woff2'
+    fuente.save(salida)
+    return salida.getvalue()
+
+
+def _plantillas():
+    return {ruta: ruta.read_text(encoding='utf-8') for ruta in sorted(PLANTILLAS.rglob('*.html'))}
+
+
+def _hojas(texto):
+    return [
+        hoja
+        for enlace in _ENLACE.findall(texto) if 'stylesheet' in enlace
+        for hoja in _HOJA.findall(enlace)
+    ]
+
+
+def hojas_enlazadas(plantillas=None):
+    """{ruta estática de la hoja: [plantillas que la enlazan]}."""
+    enlaces = {}
+    for ruta, texto in (plantillas or _plantillas()).items():
+        for hoja in _hojas(texto):
+            enlaces.setdefault(hoja, []).append(ruta)
+    return enlaces
+
+
+def construir():
+    """Genera users/static/users/dist/ y su manifiesto.
+
+    Devuelve {hoja: (bytes antes, bytes después)} y {fuente recortada: bytes}.
+    """
+    plantillas = _plantillas()
+    enlaces = hojas_enlazadas(plantillas)
+    # Las plantillas sin hojas propias (las que se incluyen en otras) cuentan para todas
+    comunes = ' '.join(t for r, t in plantillas.items() if not _hojas(t))
+    comunes += ' '.join(js.read_text(encoding='utf-8', errors='ignore') for js in sorted(SCRIPTS.rglob('*.js')))
+
+    salida = ESTATICOS / DESTINO
+    shutil.rmtree(salida, ignore_errors=True)
+    salida.mkdir(parents=True)
+    manifiesto = {}
+    tamanos = {}
+    fuentes = {}
+
+    for hoja, usuarias in sorted(enlaces.items()):
+        ruta = ESTATICOS / hoja
+        if not ruta.is_file():
+            continue
+        texto = ' '.join(plantillas[p] for p in usuarias) + ' ' + comunes
+        reducida = _Hoja(ruta, set(_PALABRA.findall(texto)))
+        caracteres = reducida.caracteres()
+
+        def fuente_recortada(origen):
+            clave = (origen.resolve(), frozenset(caracteres))
+            if clave not in fuentes:
+                contenido = _recortar(origen, caracteres)
+                nombre = _con_hash(origen.stem + '.woff2', contenido)
+                (salida / nombre).write_bytes(contenido)
+                fuentes[clave] = nombre
+            return fuentes[clave]
+
+        contenido = _ascii(reducida.css(fuente_recortada)).encode('ascii')
+        nombre = _con_hash(posixpath.basename(hoja), contenido)
+        (salida / nombre).write_bytes(contenido)
+        manifiesto[hoja] = f"{DESTINO}/{nombre}"
+        tamanos[hoja] = (ruta.stat().st_size, len(contenido))
+
+    MANIFIESTO.write_text(json.dumps(manifiesto, indent=2, sort_keys=True), encoding='utf-8')
+    return tamanos, {nombre: (salida / nombre).stat().st_size for nombre in fuentes.values()}
@@ -0,0 +1,217 @@
+"""Almacenamiento por contenido para las imágenes subidas.
+
+Cada archivo se guarda una sola vez, con el sha256 de su contenido como nombre y
+repartido en dos niveles de carpetas bajo el directorio de `upload_to`
+(destinos/ab/cd/abcd….jpg). Subir otra vez la misma imagen no crea una copia:
+el registro nuevo apunta al mismo archivo. El hash se calcula mientras se
+copia la subida a un temporal, sin leerla dos veces.
+
+Como un archivo puede estar en uso por varios registros, `delete` no borra
+nada; `recolectar` (comando recolectar_medios) elimina los que ya nadie
+referencia y `migrar` pasa a este esquema los archivos subidos antes.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+
+# Temporales de subidas en curso, junto a las carpetas de hashes
+PREFIJO_TEMPORAL = '.subida-'
+_BLOB = re.compile(r'[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+
+def es_blob(nombre):
+    """True si `nombre` tiene la forma de un archivo guardado por contenido."""
+    partes = nombre.split('/')
+    return len(partes) >= 3 and bool(_BLOB.match('/'.join(partes[-3:])))
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """FileSystemStorage que nombra los archivos por el hash de su contenido."""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo lo decide _save; si ya existe, es el mismo contenido
+        return name
+
+    def _save(self, name, content):
+        directorio = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        carpeta = self.path(directorio)
+        os.makedirs(carpeta, exist_ok=True)
+
+        huella = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=carpeta, prefix=PREFIJO_TEMPORAL, delete=False) as temporal:
+            try:
+                for trozo in content.chunks():
+                    huella.update(trozo)
+                    temporal.write(trozo)
+            except BaseException:
+                temporal.close()
+                os.unlink(temporal.name)
+                raise
+
+        huella = huella.hexdigest()
+        nombre = posixpath.join(directorio, huella[:2], huella[2:4], huella + extension)
+        ruta = self.path(nombre)
+        if os.path.exists(ruta):
+            os.unlink(temporal.name)
+            # Reusado ahora: que la recolección no lo tome por abandonado
+            os.utime(ruta)
+            return nombre
+
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(os.path.dirname(ruta), self.directory_permissions_mode)
+        os.replace(temporal.name, ruta)
+        if self.file_permissions_mode is not None:
+            os.chmod(ruta, self.file_permissions_mode)
+        return nombre
+
+    def delete(self, name):
+        """No borra: otros registros pueden apuntar al mismo archivo."""
+
+    def borrar(self, name):
+        """Borra `name` del disco; solo para la recolección de archivos sin uso."""
+        super().delete(name)
+
+
+por_contenido = AlmacenamientoPorContenido()
+
+
+def _campos():
+    """(modelo, campo) de los archivos guardados por contenido."""
+    from .models import Destino, Pago
+    return [(Destino, 'imagen'), (Pago, 'comprobante')]
+
+
+def _referenciados():
+    nombres = set()
+    for modelo, campo in _campos():
+        nombres.update(
+            modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            .values_list(campo, flat=True).distinct()
+        )
+    return nombres
+
+
+def migrar(simular=False):
+    """Guarda por contenido los archivos referenciados con nombre antiguo y actualiza los registros.
+
+    Los archivos antiguos quedan en disco hasta que `recolectar` los borre con `legado`.
+    Devuelve cuántos nombres se migraron.
+    """
+    from .models import Destino
+    migrados = 0
+    for modelo, campo in _campos():
+        directorio = modelo._meta.get_field(campo).upload_to.strip('/')
+        viejos = (
+            modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            .values_list(campo, flat=True).distinct()
+        )
+        for viejo in viejos:
+            if es_blob(viejo) or not por_contenido.exists(viejo):
+                continue
+            migrados += 1
+            if simular:
+                continue
+            with por_contenido.open(viejo, 'rb') as archivo:
+                nuevo = por_contenido.save(posixpath.join(directorio, posixpath.basename(viejo)), archivo)
+            registros = modelo.objects.filter(**{campo: viejo})
+            if modelo is Destino:
+                # Las variantes salen del mismo contenido: siguen valiendo con el nombre nuevo
+                for destino in registros.exclude(imagen_variantes={}):
+                    if destino.imagen_variantes.get('origen') == viejo:
+                        destino.imagen_variantes['origen'] = nuevo
+                        Destino.objects.filter(pk=destino.pk).update(imagen_variantes=destino.imagen_variantes)
+            registros.update(**{campo: nuevo})
+    if migrados and not simular:
+        from . import catalogo
+        catalogo.invalidar()
+    return migrados
+
+
+def _antiguo(ruta, limite):
+    try:
+        return os.stat(ruta).st_mtime < limite
+    except FileNotFoundError:
+        return False
+
+
+def _tamano(ruta):
+    if os.path.isdir(ruta):
+        return sum(
+            os.path.getsize(os.path.join(raiz, archivo))
+            for raiz, _, archivos in os.walk(ruta) for archivo in archivos
+        )
+    return os.path.getsize(ruta)
+
+
+def recolectar(horas=24, legado=False, simular=False):
+    """Borra los archivos que ningún registro referencia y que llevan `horas` sin tocarse.
+
+    Incluye los temporales de subidas interrumpidas y las variantes de imágenes
+    sin destino (users.imagenes). Con `legado` borra también los archivos sin
+    referencia de nombre antiguo. Devuelve (borrados, bytes liberados).
+    """
+    from . import imagenes
+    from .models import Destino
+
+    limite = time.time() - horas * 3600
+    referenciados = _referenciados()
+    variantes = por_contenido.path(imagenes.CARPETA)
+    sobrantes = []
+
+    for modelo, campo in _campos():
+        raiz = por_contenido.path(modelo._meta.get_field(campo).upload_to.strip('/'))
+        for carpeta, subcarpetas, archivos in os.walk(raiz):
+            if carpeta == os.path.dirname(variantes):
+                subcarpetas[:] = [s for s in subcarpetas if os.path.join(carpeta, s) != variantes]
+            for archivo in archivos:
+                ruta = os.path.join(carpeta, archivo)
+                nombre = os.path.relpath(ruta, por_contenido.location).replace(os.sep, '/')
+                temporal = archivo.startswith(PREFIJO_TEMPORAL)
+                if not temporal and (nombre in referenciados or not (legado or es_blob(nombre))):
+                    continue
+                if _antiguo(ruta, limite):
+                    sobrantes.append(ruta)
+
+    if os.path.isdir(variantes):
+        en_uso = {
+            posixpath.basename(nombre)
+            for nombre in Destino.objects.exclude(imagen='').exclude(imagen__isnull=True)
+            .values_list('imagen', flat=True)
+        }
+        for carpeta in os.listdir(variantes):
+            ruta = os.path.join(variantes, carpeta)
+            if carpeta not in en_uso and _antiguo(ruta, limite):
+                sobrantes.append(ruta)
+
+    liberados = 0
+    for ruta in sobrantes:
+        liberados += _tamano(ruta)
+        if simular:
+            continue
+        if os.path.isdir(ruta):
+            shutil.rmtree(ruta, ignore_errors=True)
+        else:
+            nombre = os.path.relpath(ruta, por_contenido.location).replace(os.sep, '/')
+            por_contenido.borrar(nombre)
+            if es_blob(nombre):
+                _quitar_carpetas_vacias(ruta)
+    return len(sobrantes), liberados
+
+
+def _quitar_carpetas_vacias(ruta):
+    """Quita las dos carpetas de hash de `ruta` si quedaron vacías."""
+    carpeta = os.path.dirname(ruta)
+    for _ in range(2):
+        try:
+            os.rmdir(carpeta)
+        except OSError:
+            return
+        carpeta = os.path.dirname(carpeta)
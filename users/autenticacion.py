@@ -0,0 +1,54 @@
+"""Backend de autenticación que guarda en caché el usuario de la sesión.
+
+AuthenticationMiddleware carga el Usuario en cada petición autenticada, y casi
+todas las vistas solo miran request.user.rol. Con USUARIOS_EN_CACHE este
+backend guarda los campos del usuario en el caché de sesiones (CACHES
+'sesiones') y lo rearma sin consultar la base de datos. La entrada se olvida
+al guardarse o borrarse el usuario (users.signals), lo que cubre el cambio de
+contraseña: set_password va seguido de save, y el hash de la sesión se
+compara con la contraseña guardada. USUARIOS_CACHE_SEGUNDOS acota lo que
+puede durar una entrada si algo cambia la fila sin pasar por save().
+
+Los permisos y grupos no se guardan: los sigue consultando ModelBackend.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def _clave(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def olvidar(usuario_id):
+    """Borra el usuario del caché ahora y otra vez al confirmarse la transacción.
+
+    El segundo borrado descarta lo que otra petición haya guardado leyendo la
+    fila anterior mientras la transacción seguía abierta.
+    """
+    clave = _clave(usuario_id)
+    _cache().delete(clave)
+    transaction.on_commit(lambda: _cache().delete(clave))
+
+
+class BackendConCache(ModelBackend):
+    """ModelBackend cuyo get_user lee primero del caché."""
+
+    def get_user(self, user_id):
+        Usuario = get_user_model()
+        clave = _clave(user_id)
+        valores = _cache().get(clave)
+        if valores is None:
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                valores = [getattr(usuario, campo.attname) for campo in Usuario._meta.concrete_fields]
+                _cache().set(clave, valores, settings.USUARIOS_CACHE_SEGUNDOS)
+            return usuario
+        usuario = Usuario.from_db('default', [c.attname for c in Usuario._meta.concrete_fields], valores)
+        return usuario if self.user_can_authenticate(usuario) else None
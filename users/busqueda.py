@@ -0,0 +1,225 @@
+"""Búsqueda del historial de ventas y del directorio de usuarios.
+
+Cada venta guarda en `Ventas.busqueda` un documento normalizado (sin acentos y
+en minúsculas) con el destino, el nombre y la cédula del comprador. En
+PostgreSQL ese campo tiene un índice GIN sobre su tsvector (palabras por
+prefijo) y otro trigram (fragmentos de cédula); en otras bases se mantiene la
+tabla VentaTermino con una fila por palabra y se busca por rango de prefijo.
+
+Los términos numéricos y de fecha no se comparan como texto: se convierten en
+filtros por rango sobre `fecha_compra`, `hora`, `cantidad` y `total_pagado`.
+
+Los usuarios se buscan sin documento aparte: en PostgreSQL `nombre` y `email`
+tienen índices trigram sobre UPPER() (los que usa icontains), y las cédulas y
+correos se buscan por prefijo, que aprovecha los índices de patrón.
+"""
+import datetime
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Usuario, Ventas, VentaTermino
+
+CONFIG = 'simple'
+# Los fragmentos de cédula más cortos no aprovechan el índice trigram
+MIN_FRAGMENTO = 3
+# Números mayores no caben en total_pagado (solo pueden ser una cédula)
+MAX_MONTO = 10 ** 8
+
+_PALABRA = re.compile(r'[^\W_]+')
+_FECHA_DMA = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})$')
+_FECHA_AMD = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})$')
+_MES_MA = re.compile(r'(\d{1,2})/(\d{4})$')
+_MES_AM = re.compile(r'(\d{4})-(\d{1,2})$')
+_HORA = re.compile(r'(\d{1,2}):(\d{2})$')
+_DECIMAL = re.compile(r'\d+[.,]\d{1,2}$')
+_ENTERO = re.compile(r'\d+$')
+
+
+def _postgres():
+    return connection.vendor == 'postgresql'
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def palabras(texto):
+    return _PALABRA.findall(normalizar(texto))
+
+
+def documento(destino, nombre, cedula):
+    return ' '.join(palabras(f'{destino} {nombre} {cedula}'))
+
+
+def indexar(venta_ids):
+    """Recalcula el documento de búsqueda de las ventas indicadas."""
+    venta_ids = list(venta_ids)
+    if not venta_ids:
+        return 0
+    ventas = [
+        Ventas(pk=venta_id, busqueda=documento(destino, nombre, cedula))
+        for venta_id, destino, nombre, cedula in Ventas.objects.filter(pk__in=venta_ids).values_list(
+            'id', 'destino__nombre', 'usuario__nombre', 'usuario__cedula'
+        )
+    ]
+    with transaction.atomic():
+        Ventas.objects.bulk_update(ventas, ['busqueda'])
+        if not _postgres():
+            VentaTermino.objects.filter(venta_id__in=venta_ids).delete()
+            VentaTermino.objects.bulk_create([
+                VentaTermino(venta_id=venta.pk, termino=termino[:100])
+                for venta in ventas
+                for termino in set(venta.busqueda.split())
+            ])
+    return len(ventas)
+
+
+def reindexar(ventas, lote=1000):
+    """Indexa `ventas` (un queryset) por lotes de ids; devuelve cuántas se indexaron."""
+    total = 0
+    ultimo = 0
+    while True:
+        ids = list(
+            ventas.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:lote]
+        )
+        if not ids:
+            return total
+        total += indexar(ids)
+        ultimo = ids[-1]
+
+
+def _dia(fecha):
+    inicio = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+    return inicio, inicio + datetime.timedelta(days=1)
+
+
+def _mes(anio, mes):
+    inicio = datetime.date(anio, mes, 1)
+    fin = datetime.date(anio + mes // 12, mes % 12 + 1, 1)
+    return (
+        timezone.make_aware(datetime.datetime.combine(inicio, datetime.time.min)),
+        timezone.make_aware(datetime.datetime.combine(fin, datetime.time.min)),
+    )
+
+
+def _anio(anio):
+    return _mes(anio, 1)[0], _mes(anio + 1, 1)[0]
+
+
+def _en_rango(campo, inicio, fin):
+    return Q(**{f'{campo}__gte': inicio, f'{campo}__lt': fin})
+
+
+def _palabra(palabra):
+    """Ventas cuyo documento tiene una palabra que empieza por `palabra`."""
+    if not _postgres():
+        return Q(pk__in=VentaTermino.objects.filter(
+            termino__gte=palabra, termino__lt=palabra + '\U0010ffff'
+        ).values('venta_id'))
+    if palabra.isdigit() and len(palabra) >= MIN_FRAGMENTO:
+        # Fragmento de cédula: LIKE '%...%' con el índice trigram
+        return Q(busqueda__contains=palabra)
+    return Q(documento_busqueda=SearchQuery(f'{palabra}:*', config=CONFIG, search_type='raw'))
+
+
+def _termino(termino):
+    """Q de un término de la búsqueda, o None si no se puede interpretar."""
+    try:
+        if m := _FECHA_DMA.match(termino):
+            return _en_rango('fecha_compra', *_dia(datetime.date(int(m[3]), int(m[2]), int(m[1]))))
+        if m := _FECHA_AMD.match(termino):
+            return _en_rango('fecha_compra', *_dia(datetime.date(int(m[1]), int(m[2]), int(m[3]))))
+        if m := _MES_MA.match(termino):
+            return _en_rango('fecha_compra', *_mes(int(m[2]), int(m[1])))
+        if m := _MES_AM.match(termino):
+            return _en_rango('fecha_compra', *_mes(int(m[1]), int(m[2])))
+        if m := _HORA.match(termino):
+            hora = datetime.time(int(m[1]), int(m[2]))
+            fin = (datetime.datetime.combine(datetime.date.min, hora) + datetime.timedelta(minutes=1)).time()
+            return Q(hora__gte=hora) & (Q(hora__lt=fin) if fin > hora else Q())
+        if _DECIMAL.match(termino):
+            return Q(total_pagado=Decimal(termino.replace(',', '.')))
+    except (ValueError, InvalidOperation):
+        pass
+
+    if _ENTERO.match(termino):
+        numero = int(termino)
+        condicion = _palabra(termino)
+        if numero < MAX_MONTO:
+            condicion |= Q(cantidad=numero) | _en_rango('total_pagado', numero, numero + 1)
+        if 1900 <= numero <= 2100:
+            condicion |= _en_rango('fecha_compra', *_anio(numero))
+        return condicion
+
+    condiciones = [_palabra(palabra) for palabra in palabras(termino)]
+    if not condiciones:
+        return None
+    condicion = condiciones[0]
+    for otra in condiciones[1:]:
+        condicion &= otra
+    return condicion
+
+
+def filtrar(ventas, texto):
+    """Filtra `ventas` por todos los términos de `texto` (separados por espacios)."""
+    if _postgres():
+        ventas = ventas.alias(documento_busqueda=SearchVector('busqueda', config=CONFIG))
+    for termino in texto.split():
+        condicion = _termino(termino)
+        if condicion is not None:
+            ventas = ventas.filter(condicion)
+    return ventas
+
+
+def _termino_usuario(termino):
+    if '@' in termino:
+        return Q(email__istartswith=termino)
+    if termino.isdigit():
+        return Q(cedula__startswith=termino)
+    condicion = Q(nombre__icontains=termino) | Q(email__icontains=termino)
+    if termino.lower() in dict(Usuario.ROLES):
+        condicion |= Q(rol=termino.lower())
+    return condicion
+
+
+def filtrar_usuarios(usuarios, texto):
+    """Filtra `usuarios` por todos los términos de `texto`.
+
+    Un término con '@' es un prefijo de correo y uno numérico un prefijo de
+    cédula; el resto se busca en el nombre y el correo, o como rol exacto.
+    """
+    for termino in texto.split():
+        usuarios = usuarios.filter(_termino_usuario(termino))
+    return usuarios
+
+
+def autocompletar_usuarios(usuarios, texto, limite=None):
+    """Primeros `limite` usuarios que coinciden con `texto`, como diccionarios.
+
+    En PostgreSQL la consulta se corta a los AUTOCOMPLETAR_TIMEOUT_MS
+    milisegundos; si se agota se devuelve una lista vacía.
+    """
+    limite = limite or settings.AUTOCOMPLETAR_LIMITE
+    if len(texto.strip()) < 2:
+        return []
+    consulta = filtrar_usuarios(usuarios, texto).order_by('id').values(
+        'id', 'nombre', 'email', 'cedula', 'rol'
+    )[:limite]
+    if not _postgres():
+        return list(consulta)
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [settings.AUTOCOMPLETAR_TIMEOUT_MS])
+            return list(consulta)
+    except DatabaseError:
+        return []
@@ -0,0 +1,123 @@
+"""Vencimiento de las reservas en carrito.
+
+Los boletos de un CarritoBoletos más viejo que CARRITO_TTL_MINUTOS vuelven a
+estar libres y el carrito se elimina. Los carritos de paquetes vencidos se
+eliminan junto con sus paquetes, igual que al quitarlos a mano del carrito.
+Todo se hace por lotes de CARRITO_LIMPIEZA_LOTE filas, cada uno en su propia
+transacción, para no bloquear las tablas mientras se compra.
+
+La limpieza no corre dentro del proceso web (con --preload un hilo arrancado
+al importar quedaría solo en el maestro de gunicorn): la hace el comando
+liberar_carritos, desde cron o como proceso aparte con --cada.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import inventario
+from .eventos import registrar
+from .models import Boleto, CarritoBoletos, CarritoPaquetes, Paquete
+
+logger = logging.getLogger(__name__)
+
+
+def _bloquear(qs):
+    if connection.features.has_select_for_update_skip_locked:
+        return qs.select_for_update(skip_locked=True)
+    return qs
+
+
+def _por_lotes(nombre, lote, procesar):
+    """Llama a `procesar(lote)` hasta agotar las filas y mide cada lote.
+
+    `procesar` devuelve cuántas filas tomó del lote y cuántas liberó.
+    """
+    lotes = []
+    while True:
+        inicio = time.monotonic()
+        with transaction.atomic():
+            tomadas, liberadas = procesar(lote)
+        if not tomadas:
+            break
+        lotes.append({
+            'tipo': nombre,
+            'lote': len(lotes) + 1,
+            'filas': liberadas,
+            'segundos': time.monotonic() - inicio,
+        })
+        registrar('carritos.liberados', **lotes[-1])
+        if tomadas < lote:
+            break
+    return lotes
+
+
+def liberar_vencidos(ttl_minutos=None, lote=None, ahora=None):
+    """Libera todas las reservas vencidas y devuelve el detalle de cada lote.
+
+    Cada elemento es un dict con `tipo`, `lote`, `filas` (boletos liberados o
+    paquetes eliminados) y `segundos`.
+    """
+    ttl = settings.CARRITO_TTL_MINUTOS if ttl_minutos is None else ttl_minutos
+    lote = lote or settings.CARRITO_LIMPIEZA_LOTE
+    limite = (ahora or timezone.now()) - timedelta(minutes=ttl)
+
+    def boletos(n):
+        ids = list(_bloquear(
+            CarritoBoletos.objects.filter(fecha_agregado__lt=limite).order_by('id')
+        ).values_list('id', flat=True)[:n])
+        if not ids:
+            return 0, 0
+        retenidos = Boleto.objects.filter(carritoboletos__id__in=ids, estado='carrito')
+        inventario.mover(retenidos, 'carrito', 'libre')
+        liberados = retenidos.update(estado='libre')
+        CarritoBoletos.objects.filter(id__in=ids).delete()
+        return len(ids), liberados
+
+    def paquetes(n):
+        ids = list(_bloquear(
+            CarritoPaquetes.objects.filter(fecha_agregado__lt=limite).order_by('id')
+        ).values_list('id', flat=True)[:n])
+        if not ids:
+            return 0, 0
+        eliminados = Paquete.objects.filter(carritopaquetes__id__in=ids, estado='carrito').delete()[1]
+        CarritoPaquetes.objects.filter(id__in=ids).delete()
+        return len(ids), eliminados.get('users.Paquete', 0)
+
+    def huerfanos(n):
+        # Paquetes sin carrito ni venta, p. ej. los que deja vaciar_carrito
+        ids = list(
+            Paquete.objects.filter(
+                fecha_envio__lt=limite,
+                carritopaquetes__isnull=True,
+                ventas__isnull=True,
+            ).exclude(estado='vendido').order_by('id').values_list('id', flat=True)[:n]
+        )
+        if ids:
+            Paquete.objects.filter(id__in=ids).delete()
+        return len(ids), len(ids)
+
+    return (
+        _por_lotes('boletos', lote, boletos)
+        + _por_lotes('paquetes', lote, paquetes)
+        + _por_lotes('paquetes huérfanos', lote, huerfanos)
+    )
+
+
+def liberar_cada(intervalo, **opciones):
+    """Llama a `liberar_vencidos` cada `intervalo` segundos y entrega los lotes de cada pasada.
+
+    No termina nunca; lo usa `liberar_carritos --cada` como proceso aparte.
+    """
+    while True:
+        close_old_connections()
+        try:
+            yield liberar_vencidos(**opciones)
+        except Exception:
+            logger.exception("Error liberando carritos vencidos")
+        finally:
+            close_old_connections()
+        time.sleep(intervalo)
@@ -0,0 +1,95 @@
+"""Versión del catálogo de destinos para las cachés de página y fragmento.
+
+Las páginas públicas del catálogo (index, destiny y list_destinos) guardan en
+el caché compartido (CACHES) los fragmentos que muestran destinos, con la
+versión del catálogo en la clave. Guardar o borrar un Destino, Horario o
+CosteEnvio cambia la versión al confirmarse la transacción (users.signals), así
+que los fragmentos viejos dejan de usarse sin tener que buscarlos ni borrarlos;
+caducan solos a los CATALOGO_CACHE_SEGUNDOS.
+
+Las vistas pasan los destinos como queryset sin evaluar: si el fragmento está
+en caché no se consulta la base de datos. Lo que depende del usuario (menú,
+token CSRF) queda fuera de los fragmentos.
+
+Los boletos disponibles cambian con cada reserva sin pasar por estas señales;
+se muestran con hasta CATALOGO_CACHE_SEGUNDOS de retraso, y la reserva siempre
+vuelve a comprobar el inventario.
+
+La portada (index) no recorre el catálogo: `destacados` sortea entre los ids
+de los destinos con imagen, guardados en caché por versión, y toma del caché
+las tarjetas ya renderizadas; solo las que falten se buscan por clave primaria.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CLAVE_VERSION = 'catalogo:version'
+# Los ids y las tarjetas solo cambian con la versión; la clave nueva los reemplaza
+VIDA_PORTADA = 24 * 3600
+
+
+def version():
+    """Versión actual del catálogo; la crea si el caché no la tiene."""
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        # Basada en la hora: si se vacía el caché no se repite una versión anterior
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+        actual = cache.get(CLAVE_VERSION)
+    return actual
+
+
+def invalidar():
+    """Cambia la versión del catálogo: las páginas se vuelven a generar."""
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def invalidar_al_confirmar():
+    transaction.on_commit(invalidar)
+
+
+def contexto():
+    """Variables que usan las plantillas en la clave y la duración de los fragmentos."""
+    return {
+        'catalogo_version': version(),
+        'catalogo_segundos': settings.CATALOGO_CACHE_SEGUNDOS,
+    }
+
+
+def ids_destacables(actual=None):
+    """Ids de los destinos que pueden salir en la portada (los que tienen imagen)."""
+    clave = f'catalogo:ids:{actual or version()}'
+    ids = cache.get(clave)
+    if ids is None:
+        from .models import Destino
+        ids = list(
+            Destino.objects.exclude(imagen='').exclude(imagen__isnull=True)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        cache.set(clave, ids, VIDA_PORTADA)
+    return ids
+
+
+def destacados(cantidad=3):
+    """HTML de las tarjetas de `cantidad` destinos elegidos al azar, en el orden del sorteo."""
+    actual = version()
+    ids = ids_destacables(actual)
+    elegidos = random.sample(ids, min(cantidad, len(ids)))
+    claves = {pk: f'catalogo:tarjeta:{actual}:{pk}' for pk in elegidos}
+    tarjetas = cache.get_many(list(claves.values()))
+
+    faltan = [pk for pk, clave in claves.items() if clave not in tarjetas]
+    if faltan:
+        from .models import Destino
+        nuevas = {
+            claves[destino.pk]: render_to_string('users/tarjeta_destino.html', {'destino': destino})
+            for destino in Destino.objects.filter(pk__in=faltan)
+        }
+        cache.set_many(nuevas, VIDA_PORTADA)
+        tarjetas.update(nuevas)
+    # Un destino borrado entre el sorteo y la consulta simplemente no se muestra
+    return [mark_safe(tarjetas[clave]) for clave in claves.values() if clave in tarjetas]
@@ -0,0 +1,113 @@
+"""Cierre de compra a partir de los carritos de un usuario.
+
+Todo el proceso usa operaciones por conjuntos, así que la cantidad de consultas
+no depende de cuántos boletos o paquetes haya en el carrito.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import busqueda, facturas, inventario, reportes
+from .eventos import registrar
+from .models import Boleto, CarritoBoletos, CarritoPaquetes, Paquete, Usuario, Ventas
+
+
+def _agregado(qs, funcion, output_field, vacio):
+    return Coalesce(
+        Subquery(qs.annotate(valor=funcion).values('valor')[:1], output_field=output_field),
+        Value(vacio, output_field=output_field),
+    )
+
+
+def totales_carrito(usuario):
+    """Cantidad y monto de boletos y paquetes en los carritos del usuario, en una consulta."""
+    boletos = Boleto.objects.filter(
+        carritoboletos__usuario=OuterRef('pk')
+    ).order_by().values('carritoboletos__usuario')
+    paquetes = Paquete.objects.filter(
+        carritopaquetes__usuario=OuterRef('pk')
+    ).order_by().values('carritopaquetes__usuario')
+    dinero = DecimalField(max_digits=12, decimal_places=2)
+
+    totales = Usuario.objects.filter(pk=usuario.pk).annotate(
+        num_boletos=_agregado(boletos, Count('id'), IntegerField(), 0),
+        total_boletos=_agregado(boletos, Sum('precio'), dinero, Decimal('0')),
+        num_paquetes=_agregado(paquetes, Count('id'), IntegerField(), 0),
+        total_paquetes=_agregado(paquetes, Sum('precio_envio'), dinero, Decimal('0')),
+    ).values('num_boletos', 'total_boletos', 'num_paquetes', 'total_paquetes').get()
+
+    totales['total'] = totales['total_boletos'] + totales['total_paquetes']
+    return totales
+
+
+@transaction.atomic
+def procesar_compra(usuario, base_url=None):
+    """Convierte los carritos del usuario en una Venta y los vacía.
+
+    Con `base_url` (y FACTURAS_PRERENDER) la factura en PDF se encola al
+    confirmarse la transacción, para que esté lista cuando se pida.
+    """
+    carritos_boletos = list(
+        CarritoBoletos.objects.select_for_update().filter(usuario=usuario)
+        .order_by('id').values_list('id', 'destino_id')
+    )
+    carritos_paquetes = list(
+        CarritoPaquetes.objects.select_for_update().filter(usuario=usuario)
+        .order_by('id').values_list('id', 'destino_id')
+    )
+    ids_carritos_boletos = [carrito_id for carrito_id, _ in carritos_boletos]
+    ids_carritos_paquetes = [carrito_id for carrito_id, _ in carritos_paquetes]
+
+    # Solo lo de los carritos bloqueados: lo que se agregue mientras tanto queda para otra compra
+    precios_boletos = dict(
+        Boleto.objects.filter(carritoboletos__id__in=ids_carritos_boletos).values_list('id', 'precio')
+    )
+    precios_paquetes = dict(
+        Paquete.objects.filter(carritopaquetes__id__in=ids_carritos_paquetes).values_list('id', 'precio_envio')
+    )
+    boleto_ids = list(precios_boletos)
+    paquete_ids = list(precios_paquetes)
+
+    if not boleto_ids and not paquete_ids:
+        raise ValueError("No hay productos para procesar.")
+
+    total = sum(precios_boletos.values(), Decimal('0')) + sum(precios_paquetes.values(), Decimal('0'))
+    destino_id = (carritos_boletos or carritos_paquetes)[0][1]
+
+    venta = Ventas.objects.create(
+        usuario=usuario,
+        destino_id=destino_id,
+        cantidad=len(boleto_ids) + len(paquete_ids),
+        hora=timezone.now().time(),
+        total_pagado=total,
+    )
+
+    if boleto_ids:
+        inventario.mover(Boleto.objects.filter(id__in=boleto_ids), 'carrito', 'vendido')
+        Boleto.objects.filter(id__in=boleto_ids).update(estado='vendido', usuario=usuario)
+        VentaBoleto = Ventas.boletos.through
+        VentaBoleto.objects.bulk_create([
+            VentaBoleto(ventas_id=venta.pk, boleto_id=boleto_id) for boleto_id in boleto_ids
+        ])
+
+    if paquete_ids:
+        Paquete.objects.filter(id__in=paquete_ids).update(estado='vendido')
+        VentaPaquete = Ventas.paquetes.through
+        VentaPaquete.objects.bulk_create([
+            VentaPaquete(ventas_id=venta.pk, paquete_id=paquete_id) for paquete_id in paquete_ids
+        ])
+
+    CarritoBoletos.objects.filter(id__in=ids_carritos_boletos).delete()
+    CarritoPaquetes.objects.filter(id__in=ids_carritos_paquetes).delete()
+
+    reportes.registrar_venta(venta, len(boleto_ids), len(paquete_ids))
+    busqueda.indexar([venta.pk])
+    if base_url and settings.FACTURAS_PRERENDER and settings.FACTURAS_PROCESOS:
+        transaction.on_commit(lambda: facturas.prerenderizar(venta.pk, base_url))
+    registrar('venta.creada', venta=venta.pk, usuario=usuario.pk, destino=destino_id,
+              total=venta.total_pagado, boletos=boleto_ids, paquetes=paquete_ids)
+    return venta
@@ -0,0 +1,150 @@
+"""Registro estructurado de eventos (boletos, paquetes, pagos y ventas).
+
+`registrar()` no escribe nada en el hilo de la petición: encola el evento y un
+hilo despachador por proceso lo saca de la cola por lotes y lo escribe como una
+línea JSON en EVENTOS_ARCHIVO y, si EVENTOS_AUDITORIA_BD está activo, en la
+tabla EventoAuditoria con un solo bulk_create por lote.
+
+Todos los workers de gunicorn escriben en el mismo archivo, cada línea con una
+sola escritura en modo append. Ningún proceso lo rota: lo hace logrotate (o
+similar) desde fuera, y WatchedFileHandler vuelve a abrirlo cuando cambia.
+
+Los eventos registrados dentro de una transacción se encolan al confirmarse, así
+que un cambio revertido no deja rastro.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_cola = None
+_pid = None
+_candado = threading.Lock()
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento: fecha, evento, proceso y datos."""
+
+    def format(self, record):
+        return json.dumps({
+            'fecha': record.fecha.isoformat(),
+            'evento': record.evento,
+            'pid': record.process,
+            'datos': record.datos,
+        }, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+class AuditoriaBDHandler(logging.Handler):
+    """Guarda lotes de eventos en EventoAuditoria con un bulk_create."""
+
+    def emitir_lote(self, records):
+        from .models import EventoAuditoria
+        try:
+            EventoAuditoria.objects.bulk_create([
+                EventoAuditoria(
+                    fecha=record.fecha,
+                    evento=record.evento,
+                    datos=json.loads(json.dumps(record.datos, cls=DjangoJSONEncoder)),
+                )
+                for record in records
+            ])
+        except Exception:
+            self.handleError(records[0])
+        finally:
+            connection.close()
+
+
+def _destinos():
+    destinos = []
+    if settings.EVENTOS_ARCHIVO:
+        archivo = Path(settings.EVENTOS_ARCHIVO)
+        archivo.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.WatchedFileHandler(archivo, encoding='utf-8')
+        handler.setFormatter(FormatoJSON())
+        destinos.append(handler)
+    if settings.EVENTOS_AUDITORIA_BD:
+        destinos.append(AuditoriaBDHandler())
+    return destinos
+
+
+def _despachar(cola, destinos):
+    lote_maximo = settings.EVENTOS_LOTE
+    while True:
+        lote = [cola.get()]
+        while len(lote) < lote_maximo:
+            try:
+                lote.append(cola.get(timeout=settings.EVENTOS_INTERVALO))
+            except queue.Empty:
+                break
+
+        _escribir(lote, destinos)
+
+
+def _escribir(lote, destinos):
+    for destino in destinos:
+        if isinstance(destino, AuditoriaBDHandler):
+            destino.emitir_lote(lote)
+            continue
+        for record in lote:
+            destino.handle(record)
+        destino.flush()
+
+
+def _vaciar(cola, destinos):
+    """Escribe lo que quede en la cola al terminar el proceso."""
+    lote = []
+    while True:
+        try:
+            lote.append(cola.get_nowait())
+        except queue.Empty:
+            break
+    if lote:
+        _escribir(lote, destinos)
+
+
+def _cola_del_proceso():
+    """Devuelve la cola de este proceso y arranca su despachador si hace falta.
+
+    Se comprueba el pid porque gunicorn (--preload) hace fork después de cargar
+    la aplicación y los hilos del proceso padre no existen en los workers.
+    """
+    global _cola, _pid
+    if _pid == os.getpid():
+        return _cola
+    with _candado:
+        if _pid != os.getpid():
+            cola = queue.SimpleQueue()
+            destinos = _destinos()
+            threading.Thread(
+                target=_despachar, args=(cola, destinos), name='eventos', daemon=True
+            ).start()
+            atexit.register(_vaciar, cola, destinos)
+            _cola, _pid = cola, os.getpid()
+    return _cola
+
+
+def _encolar(evento, datos, fecha):
+    record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, evento, (), None)
+    record.evento = evento
+    record.datos = datos
+    record.fecha = fecha
+    _cola_del_proceso().put(record)
+
+
+def registrar(evento, **datos):
+    """Registra `evento` con `datos` sin bloquear al llamador."""
+    if not settings.EVENTOS_ACTIVOS:
+        return
+    fecha = timezone.now()
+    transaction.on_commit(lambda: _encolar(evento, datos, fecha))
@@ -0,0 +1,453 @@
+"""Facturas en PDF con caché en disco.
+
+Las ventas no cambian después de creadas, así que cada PDF se guarda en
+FACTURAS_CACHE_DIR con un nombre formado por el id de la venta y el hash del
+HTML del que sale (plantilla, líneas de la factura y hoja de estilos
+versionada por el manifiesto de estáticos). Si cambia cualquiera de ellos
+cambia el hash y se genera otro archivo; `podar` borra los que llevan más de
+FACTURAS_CACHE_MAX_DIAS sin usarse y, si el caché sigue pasando de
+FACTURAS_CACHE_MAX_BYTES, los usados hace más tiempo.
+
+La conversión a PDF puede hacerse fuera de la petición: `encolar` la manda a un
+pool de FACTURAS_PROCESOS procesos y devuelve el id del trabajo, que es el id
+de la venta y el hash. Mientras tanto hay un archivo `.pendiente` junto al PDF
+esperado (o `.error` si falló), así que cualquier worker de gunicorn puede
+responder por el estado del trabajo aunque no lo haya encolado él. Una factura
+que falló no se vuelve a intentar hasta pasados FACTURAS_REINTENTO_SEGUNDOS;
+mientras tanto se informa el error.
+
+WeasyPrint no pide nada por HTTP a nuestro propio gunicorn: `obtener_recurso`
+lee las URLs de /static/ y /media/ directamente de STATIC_ROOT y MEDIA_ROOT.
+Cada proceso guarda en memoria los estáticos que ya leyó (hoja de estilos,
+fuentes) y reutiliza la misma configuración de fuentes entre facturas, que es
+lo más caro de crear.
+"""
+import atexit
+import hashlib
+import io
+import logging
+import mimetypes
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+import weasyprint
+from django.apps import apps
+from django.conf import settings
+from django.template.loader import render_to_string
+from weasyprint import HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+logger = logging.getLogger(__name__)
+
+# Los temporales de una escritura interrumpida se borran pasada una hora
+VIDA_TEMPORALES = 3600
+TEMPORALES = ('.tmp', '.pendiente', '.error')
+
+_ultima_poda = 0.0
+_candado_poda = threading.Lock()
+_pool = None
+_pid = None
+_candado_pool = threading.Lock()
+
+# Estáticos leídos por este proceso: ruta -> (fecha de modificación, contenido)
+_recursos = {}
+MAX_RECURSO = 2 * 1024 * 1024
+MAX_RECURSOS = 64
+# La configuración de fuentes acumula las de cada @font-face, así que se renueva cada tanto
+RENDERS_POR_FUENTES = 200
+_fuentes = None
+_renders_fuentes = 0
+# Pango no admite usar la misma configuración de fuentes desde dos hilos a la vez
+_candado_render = threading.Lock()
+
+
+def contexto(venta):
+    """Contexto de factura_template.html para `venta` (con destino y usuario cargados)."""
+    destino = venta.destino.nombre if venta.destino else 'Destino no especificado'
+    items = [
+        {
+            'cantidad': 1,
+            'tipo': 'boleto',
+            'descripcion': f"Boleto a {destino}",
+            'detalle': f"Horario: {venta.hora.strftime('%H:%M')}",
+            'precio': precio,
+        }
+        for precio in venta.boletos.order_by('id').values_list('precio', flat=True)
+    ]
+    items += [
+        {
+            'cantidad': 1,
+            'tipo': 'paquete',
+            'descripcion': f"Paquete hacia {destino}",
+            'detalle': f"Peso: {peso} kg",
+            'precio': precio_envio,
+        }
+        for peso, precio_envio in venta.paquetes.order_by('id').values_list('peso', 'precio_envio')
+    ]
+    return {
+        'venta': venta,
+        'usuario': venta.usuario,
+        'cliente': venta.usuario,
+        'items': items,
+        'total': venta.total_pagado,
+    }
+
+
+def html_factura(venta):
+    return render_to_string('users/factura_template.html', contexto(venta))
+
+
+def huella(html):
+    """Hash del HTML de la factura y de la versión de WeasyPrint que lo convierte."""
+    return hashlib.sha256(f'{weasyprint.__version__}\n{html}'.encode()).hexdigest()[:32]
+
+
+def ruta(venta_id, huella_html):
+    return Path(settings.FACTURAS_CACHE_DIR) / f'factura_{venta_id}_{huella_html}.pdf'
+
+
+def trabajo(venta_id, huella_html):
+    return f'{venta_id}-{huella_html}'
+
+
+def _marcador(archivo, tipo):
+    return archivo.with_suffix(f'.{tipo}')
+
+
+def _usar(archivo):
+    """True si `archivo` está en el caché; actualiza su fecha de último uso para `podar`."""
+    try:
+        os.utime(archivo)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _dentro(raiz, relativa):
+    """Ruta de `relativa` dentro de `raiz`, o None si no existe o se sale de ella."""
+    if not raiz:
+        return None
+    raiz = Path(raiz).resolve()
+    camino = (raiz / relativa).resolve()
+    if camino.is_relative_to(raiz) and camino.is_file():
+        return camino
+    return None
+
+
+def _archivo_estatico(relativa):
+    camino = _dentro(settings.STATIC_ROOT, relativa)
+    if camino is None and apps.ready:
+        # Sin collectstatic (desarrollo) se buscan con los finders de staticfiles
+        from django.contrib.staticfiles import finders
+        encontrado = finders.find(relativa)
+        camino = Path(encontrado) if encontrado else None
+    return camino
+
+
+def _leer_estatico(camino):
+    fecha = camino.stat().st_mtime
+    guardado = _recursos.get(camino)
+    if guardado is not None and guardado[0] == fecha:
+        return guardado[1]
+    contenido = camino.read_bytes()
+    if len(contenido) <= MAX_RECURSO:
+        if len(_recursos) >= MAX_RECURSOS:
+            _recursos.pop(next(iter(_recursos)))
+        _recursos[camino] = (fecha, contenido)
+    return contenido
+
+
+def obtener_recurso(url, timeout=10, ssl_context=None):
+    """url_fetcher de WeasyPrint que resuelve /static/ y /media/ en disco."""
+    partes = urlsplit(url)
+    ruta_url = unquote(partes.path)
+    if partes.scheme not in ('http', 'https'):
+        return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+
+    if ruta_url.startswith(settings.STATIC_URL):
+        camino = _archivo_estatico(ruta_url[len(settings.STATIC_URL):])
+        contenido = _leer_estatico(camino) if camino is not None else None
+    elif ruta_url.startswith(settings.MEDIA_URL):
+        camino = _dentro(settings.MEDIA_ROOT, ruta_url[len(settings.MEDIA_URL):])
+        contenido = camino.read_bytes() if camino is not None else None
+    else:
+        return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+
+    if camino is None:
+        # WeasyPrint registra el error y sigue sin el recurso
+        raise ValueError(f"No existe el archivo local para {url}")
+    return {
+        'string': contenido,
+        'mime_type': mimetypes.guess_type(camino.name)[0],
+        'redirected_url': url,
+        'filename': camino.name,
+    }
+
+
+def _configuracion_fuentes():
+    global _fuentes, _renders_fuentes
+    if _fuentes is None or _renders_fuentes >= RENDERS_POR_FUENTES:
+        _fuentes = FontConfiguration()
+        _renders_fuentes = 0
+    _renders_fuentes += 1
+    return _fuentes
+
+
+def renderizar(html, base_url, archivo):
+    """Convierte `html` a PDF en `archivo`. Corre en los procesos del pool."""
+    archivo = Path(archivo)
+    archivo.parent.mkdir(parents=True, exist_ok=True)
+    with _candado_render:
+        pdf = HTML(string=html, base_url=base_url, url_fetcher=obtener_recurso).write_pdf(
+            font_config=_configuracion_fuentes()
+        )
+    with tempfile.NamedTemporaryFile(dir=archivo.parent, suffix='.tmp', delete=False) as temporal:
+        temporal.write(pdf)
+    os.replace(temporal.name, archivo)
+
+
+def obtener_pdf(venta, html, base_url):
+    """Ruta del PDF de `venta` en el caché; lo genera a partir de `html` si no existe."""
+    archivo = ruta(venta.pk, huella(html))
+    if not _usar(archivo):
+        renderizar(html, base_url, archivo)
+        _podar_si_toca()
+    return archivo
+
+
+def estado(venta_id, huella_html):
+    """'lista', 'pendiente', 'error' o None si el trabajo no existe, venció o ya puede reintentarse."""
+    archivo = ruta(venta_id, huella_html)
+    if _usar(archivo):
+        return 'lista'
+    for tipo in ('pendiente', 'error'):
+        try:
+            edad = time.time() - _marcador(archivo, tipo).stat().st_mtime
+        except FileNotFoundError:
+            continue
+        limite = settings.FACTURAS_REINTENTO_SEGUNDOS if tipo == 'error' else settings.FACTURAS_TRABAJO_TIMEOUT
+        if edad < limite:
+            return tipo
+    return None
+
+
+def _pool_del_proceso():
+    """Pool de este proceso; se crea tras el fork de gunicorn (--preload), como en users.eventos."""
+    global _pool, _pid
+    if _pid == os.getpid():
+        return _pool
+    with _candado_pool:
+        if _pid != os.getpid():
+            # spawn: los procesos hijos no heredan los hilos ni las conexiones del worker
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.FACTURAS_PROCESOS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+            _pid = os.getpid()
+    return _pool
+
+
+def _terminado(archivo, futuro):
+    _marcador(archivo, 'pendiente').unlink(missing_ok=True)
+    error = futuro.exception()
+    if error is not None:
+        logger.error("Error generando %s: %r", archivo.name, error)
+        _marcador(archivo, 'error').write_text(repr(error), encoding='utf-8')
+        return
+    _podar_si_toca()
+
+
+def encolar(venta, html, base_url):
+    """Encola la conversión del PDF de `venta` si hace falta; devuelve (trabajo, estado).
+
+    Con FACTURAS_PROCESOS = 0 el PDF se genera en el mismo proceso.
+    """
+    huella_html = huella(html)
+    id_trabajo = trabajo(venta.pk, huella_html)
+    actual = estado(venta.pk, huella_html)
+    if actual in ('lista', 'pendiente', 'error'):
+        return id_trabajo, actual
+
+    archivo = ruta(venta.pk, huella_html)
+    if not settings.FACTURAS_PROCESOS:
+        obtener_pdf(venta, html, base_url)
+        return id_trabajo, 'lista'
+
+    archivo.parent.mkdir(parents=True, exist_ok=True)
+    # Un .error que sigue aquí ya cumplió la espera para reintentar
+    _marcador(archivo, 'error').unlink(missing_ok=True)
+    pendiente = _marcador(archivo, 'pendiente')
+    if actual is None:
+        # Un .pendiente vencido es de un proceso que murió a mitad del trabajo
+        pendiente.unlink(missing_ok=True)
+    try:
+        # O_EXCL: si otro worker lo acaba de encolar, no se repite
+        os.close(os.open(pendiente, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return id_trabajo, 'pendiente'
+
+    futuro = _pool_del_proceso().submit(renderizar, html, base_url, str(archivo))
+    futuro.add_done_callback(lambda f: _terminado(archivo, f))
+    return id_trabajo, 'pendiente'
+
+
+def prerenderizar(venta_id, base_url):
+    """Encola la factura de una venta recién creada; los errores solo se registran."""
+    from .models import Ventas
+    try:
+        venta = Ventas.objects.select_related('destino', 'usuario').get(pk=venta_id)
+        encolar(venta, html_factura(venta), base_url)
+    except Exception:
+        logger.exception("No se pudo encolar la factura de la venta %s", venta_id)
+
+
+class _Flujo(io.RawIOBase):
+    """Destino no posicionable para ZipFile; `vaciar` devuelve lo escrito desde la última vez."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def exportar_zip(ventas, base_url, procesos=None, trozo=64 * 1024):
+    """Genera, trozo a trozo, un ZIP con la factura en PDF de cada venta de `ventas`.
+
+    Las facturas que ya están en el caché se copian de ahí; las demás se generan
+    (y quedan en el caché) en un pool propio de `procesos` procesos, con a lo
+    sumo el doble de trabajos en curso. Los PDF se copian al ZIP en trozos, así
+    que en memoria nunca hay más que un trozo. Las facturas que no se pudieron
+    generar se listan en errores.txt al final del ZIP.
+    """
+    procesos = settings.FACTURAS_PROCESOS if procesos is None else procesos
+    ventana = max(procesos, 1) * 2
+    pool = ProcessPoolExecutor(
+        max_workers=procesos, mp_context=multiprocessing.get_context('spawn')
+    ) if procesos else None
+    flujo = _Flujo()
+    en_curso = deque()
+    errores = []
+
+    def agregar(zf, venta, archivo, futuro):
+        nombre = f"{venta.fecha_compra:%Y-%m-%d}/factura_{venta.pk}.pdf"
+        try:
+            if futuro is not None:
+                futuro.result()
+            with open(archivo, 'rb') as origen, zf.open(nombre, 'w', force_zip64=True) as destino:
+                while datos := origen.read(trozo):
+                    destino.write(datos)
+                    yield flujo.vaciar()
+        except Exception as error:
+            logger.error("Error exportando la factura de la venta %s: %r", venta.pk, error)
+            errores.append(f"{nombre}: {error!r}")
+        yield flujo.vaciar()
+
+    try:
+        with zipfile.ZipFile(flujo, 'w', zipfile.ZIP_STORED) as zf:
+            ventas = ventas.select_related('destino', 'usuario').order_by('fecha_compra', 'id')
+            for venta in ventas.iterator(chunk_size=200):
+                html = html_factura(venta)
+                archivo = ruta(venta.pk, huella(html))
+                futuro = None
+                if not _usar(archivo):
+                    if pool is not None:
+                        futuro = pool.submit(renderizar, html, base_url, str(archivo))
+                    else:
+                        try:
+                            renderizar(html, base_url, archivo)
+                        except Exception as error:
+                            futuro = _fallido(error)
+                en_curso.append((venta, archivo, futuro))
+                while len(en_curso) >= ventana:
+                    yield from agregar(zf, *en_curso.popleft())
+
+            while en_curso:
+                yield from agregar(zf, *en_curso.popleft())
+            if errores:
+                zf.writestr('errores.txt', '\n'.join(errores) + '\n')
+        yield flujo.vaciar()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _fallido(error):
+    futuro = Future()
+    futuro.set_exception(error)
+    return futuro
+
+
+def podar(max_bytes=None, max_dias=None, ahora=None):
+    """Borra PDFs del caché por antigüedad y tamaño; devuelve (archivos, bytes) borrados."""
+    max_bytes = settings.FACTURAS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_dias = settings.FACTURAS_CACHE_MAX_DIAS if max_dias is None else max_dias
+    ahora = ahora or time.time()
+    directorio = Path(settings.FACTURAS_CACHE_DIR)
+    if not directorio.is_dir():
+        return 0, 0
+
+    archivos = []
+    borrados = liberados = 0
+    with os.scandir(directorio) as entradas:
+        for entrada in entradas:
+            if not entrada.is_file():
+                continue
+            info = entrada.stat()
+            vencido = (
+                ahora - info.st_mtime > VIDA_TEMPORALES if entrada.name.endswith(TEMPORALES)
+                else ahora - info.st_mtime > max_dias * 86400
+            )
+            if vencido:
+                borrados += _borrar(entrada.path)
+                liberados += info.st_size
+            elif entrada.name.endswith('.pdf'):
+                archivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    total = sum(tamano for _, tamano, _ in archivos)
+    for _, tamano, camino in sorted(archivos):
+        if total <= max_bytes:
+            break
+        borrados += _borrar(camino)
+        liberados += tamano
+        total -= tamano
+    return borrados, liberados
+
+
+def _borrar(camino):
+    try:
+        os.remove(camino)
+        return 1
+    except FileNotFoundError:
+        return 0
+
+
+def _podar_si_toca():
+    global _ultima_poda
+    ahora = time.monotonic()
+    with _candado_poda:
+        if ahora - _ultima_poda < settings.FACTURAS_CACHE_PODA_SEGUNDOS:
+            return
+        _ultima_poda = ahora
+    try:
+        podar()
+    except OSError:
+        logger.exception("Error podando el caché de facturas")
@@ -5,8 +5,39 @@ from .models import Usuario,Destino,Pago,Horario,Paquete,Boleto
 from django.forms import modelformset_factory
 import re
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .horarios import DIAS_SEMANA
+from . import unicidad
 
-class UsuarioRegistroForm(forms.ModelForm):
+
+class UnicidadEnBDMixin:
+    """Registro que deja la unicidad de cédula, teléfono y correo a la base de datos.
+
+    No se consulta antes de insertar: si el INSERT choca con una restricción
+    única, `save()` agrega el error al campo que chocó y devuelve None.
+    """
+
+    def validate_unique(self):
+        # Los únicos campos únicos del formulario son los de unicidad.CAMPOS
+        pass
+
+    def _guardar_usuario(self, usuario):
+        try:
+            with transaction.atomic():
+                usuario.save()
+        except IntegrityError:
+            campos = unicidad.ocupados(**{campo: getattr(usuario, campo) for campo in unicidad.CAMPOS})
+            for campo in unicidad.CAMPOS:
+                if campo in campos:
+                    self.add_error(campo, unicidad.MENSAJES[campo])
+            if not campos:
+                self.add_error(None, "No se pudo registrar el usuario. Inténtalo de nuevo.")
+            return None
+        return usuario
+
+
+class UsuarioRegistroForm(UnicidadEnBDMixin, forms.ModelForm):
     password = forms.CharField(
         label="Contraseña",
         widget=forms.PasswordInput
@@ -25,24 +56,18 @@ class UsuarioRegistroForm(forms.ModelForm):
         allowed_domains = ['@gmail.com', '@proton.me', '@outlook.com']
         if not any(email.endswith(domain) for domain in allowed_domains):
             raise ValidationError("Solo se permiten correos de Gmail, Proton o Outlook.")
-        if Usuario.objects.filter(email=email).exists():
-            raise ValidationError("Ya existe un usuario con este correo electrónico.")
         return email
 
     def clean_cedula(self):
         cedula = self.cleaned_data.get('cedula')
         if not cedula.isdigit() or len(cedula) != 8:
             raise ValidationError("La cédula debe tener exactamente 8 dígitos numéricos.")
-        if Usuario.objects.filter(cedula=cedula).exists():
-            raise ValidationError("Ya existe un usuario con esta cédula.")
         return cedula
 
     def clean_telefono(self):
         telefono = self.cleaned_data.get('telefono')
         if not telefono.isdigit() or len(telefono) != 11:
             raise ValidationError("El teléfono debe contener exactamente 11 dígitos numéricos.")
-        if Usuario.objects.filter(telefono=telefono).exists():
-            raise ValidationError("Ya existe un usuario con este número de teléfono.")
         return telefono
 
     def clean_nombre(self):
@@ -73,10 +98,10 @@ class UsuarioRegistroForm(forms.ModelForm):
         usuario.set_password(password)
         usuario.rol = 'cliente'   
         if commit:
-            usuario.save()
+            return self._guardar_usuario(usuario)
         return usuario
 
-class RegisterAspiranteForm(forms.ModelForm):
+class RegisterAspiranteForm(UnicidadEnBDMixin, forms.ModelForm):
     password = forms.CharField(
         label="Contraseña",
         widget=forms.PasswordInput
@@ -95,8 +120,6 @@ class RegisterAspiranteForm(forms.ModelForm):
         allowed_domains = ['@gmail.com', '@proton.me', '@outlook.com']
         if not any(email.endswith(domain) for domain in allowed_domains):
             raise ValidationError("Solo se permiten correos de Gmail, Proton o Outlook.")
-        if Usuario.objects.filter(email=email).exists():
-            raise ValidationError("Ya existe un usuario con este correo electrónico.")
         return email
 
     def clean_cedula(self):
@@ -139,7 +162,7 @@ class RegisterAspiranteForm(forms.ModelForm):
         usuario.set_password(password)
         usuario.rol = 'aspirante'
         if commit:
-            usuario.save()
+            return self._guardar_usuario(usuario)
         return usuario
 
 
@@ -233,7 +256,7 @@ class DestinoForm(forms.ModelForm):
 class HorarioForm(forms.ModelForm):
     class Meta:
         model = Horario
-        fields = ['destino', 'fecha', 'hora']
+        fields = ['destino', 'fecha', 'hora', 'capacidad_general', 'capacidad_vip', 'boletos_perezosos']
         widgets = {
             'fecha': forms.DateInput(attrs={'type': 'date'}),
             'hora': forms.TimeInput(attrs={'type': 'time'}),
@@ -243,6 +266,11 @@ class HorarioForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['destino'].queryset = Destino.objects.all()
 
+        # El inventario se arma al crear el horario; no se puede cambiar después
+        if self.instance.pk:
+            for campo in ('capacidad_general', 'capacidad_vip', 'boletos_perezosos'):
+                self.fields[campo].disabled = True
+
     def clean(self):
         cleaned_data = super().clean()
         destino = cleaned_data.get('destino')
@@ -260,6 +288,44 @@ class HorarioForm(forms.ModelForm):
 
 
 
+class HorarioRecurrenteForm(forms.Form):
+    destinos = forms.ModelMultipleChoiceField(
+        queryset=Destino.objects.all(),
+        widget=forms.CheckboxSelectMultiple
+    )
+    dias = forms.MultipleChoiceField(
+        label="Días de la semana",
+        choices=DIAS_SEMANA,
+        widget=forms.CheckboxSelectMultiple
+    )
+    hora = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
+    desde = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    capacidad_general = forms.IntegerField(min_value=0, initial=70)
+    capacidad_vip = forms.IntegerField(min_value=0, initial=30)
+    boletos_perezosos = forms.BooleanField(
+        required=False,
+        initial=settings.BOLETOS_PEREZOSOS,
+        label="Crear boletos al reservarse"
+    )
+    dry_run = forms.BooleanField(required=False, label="Solo simular (no guarda nada)")
+
+    MAX_DIAS = 731
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+
+        if desde and hasta:
+            if hasta < desde:
+                raise ValidationError("La fecha final debe ser posterior a la inicial.")
+            if (hasta - desde).days > self.MAX_DIAS:
+                raise ValidationError("El rango no puede superar los dos años.")
+
+        return cleaned_data
+
+
 class PagoForm(forms.ModelForm):
     class Meta:
         model = Pago
@@ -0,0 +1,95 @@
+"""Generación masiva de horarios recurrentes.
+
+Equivale a crear cada horario con HorarioForm, pero el chequeo de choques se hace
+con una sola consulta y todos los horarios con sus boletos se insertan en una
+transacción con bulk_create (sin pasar por la señal post_save de Horario, así
+que la versión del catálogo se cambia aquí).
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from . import catalogo, inventario
+from .models import Horario
+
+DIAS_SEMANA = [
+    ('0', 'Lunes'),
+    ('1', 'Martes'),
+    ('2', 'Miércoles'),
+    ('3', 'Jueves'),
+    ('4', 'Viernes'),
+    ('5', 'Sábado'),
+    ('6', 'Domingo'),
+]
+
+
+def fechas_recurrentes(dias_semana, desde, hasta):
+    """Fechas entre `desde` y `hasta` (inclusive) cuyo weekday() está en `dias_semana`."""
+    dias_semana = {int(d) for d in dias_semana}
+    fecha = desde
+    while fecha <= hasta:
+        if fecha.weekday() in dias_semana:
+            yield fecha
+        fecha += timedelta(days=1)
+
+
+def generar_recurrentes(destinos, dias_semana, horas, desde, hasta,
+                        capacidad_general=70, capacidad_vip=30, boletos_perezosos=None,
+                        dry_run=False, batch_size=1000):
+    """Crea un horario por destino, fecha y hora que no choque con uno existente.
+
+    Devuelve un resumen con los horarios creados, los omitidos por choque, los
+    boletos insertados y el tiempo de cada etapa. Con `dry_run` solo se cuenta.
+    """
+    if boletos_perezosos is None:
+        boletos_perezosos = settings.BOLETOS_PEREZOSOS
+    resumen = {'horarios': 0, 'omitidos': 0, 'boletos': 0, 'tiempos': {}}
+
+    inicio = time.monotonic()
+    fechas = list(fechas_recurrentes(dias_semana, desde, hasta))
+    candidatos = [
+        (destino, fecha, hora)
+        for destino in destinos
+        for fecha in fechas
+        for hora in horas
+    ]
+    resumen['tiempos']['calcular'] = time.monotonic() - inicio
+
+    inicio = time.monotonic()
+    existentes = set(
+        Horario.objects.filter(
+            destino__in=destinos,
+            fecha__range=(desde, hasta),
+            hora__in=horas,
+        ).values_list('destino_id', 'fecha', 'hora')
+    )
+    nuevos = [
+        Horario(
+            destino=destino,
+            fecha=fecha,
+            hora=hora,
+            capacidad_general=capacidad_general,
+            capacidad_vip=capacidad_vip,
+            boletos_perezosos=boletos_perezosos,
+        )
+        for destino, fecha, hora in candidatos
+        if (destino.pk, fecha, hora) not in existentes
+    ]
+    resumen['omitidos'] = len(candidatos) - len(nuevos)
+    resumen['tiempos']['choques'] = time.monotonic() - inicio
+
+    resumen['horarios'] = len(nuevos)
+    if dry_run:
+        resumen['boletos'] = 0 if boletos_perezosos else len(nuevos) * (capacidad_general + capacidad_vip)
+        return resumen
+
+    inicio = time.monotonic()
+    with transaction.atomic():
+        Horario.objects.bulk_create(nuevos, batch_size=batch_size)
+        resumen['boletos'] = inventario.crear_boletos(nuevos, batch_size=batch_size)
+        catalogo.invalidar_al_confirmar()
+    resumen['tiempos']['insertar'] = time.monotonic() - inicio
+
+    return resumen
@@ -0,0 +1,168 @@
+"""Variantes redimensionadas de las imágenes de los destinos.
+
+Por cada imagen se guardan en MEDIA_ROOT/destinos/variantes/ copias WebP y JPEG
+a los anchos de IMAGENES_ANCHOS (nunca más anchas que el original) y un
+marcador de unos pocos píxeles en base64 que la página muestra de fondo
+mientras carga la imagen. Los nombres y medidas quedan en
+Destino.imagen_variantes, así que las plantillas arman el srcset sin tocar el
+disco; mientras no existan se sirve el original.
+
+Las variantes no se generan en la petición: al guardarse un destino con una
+imagen nueva se encolan al confirmarse la transacción y un hilo por proceso las
+genera (Pillow suelta el GIL mientras decodifica, redimensiona y codifica). El
+comando generar_variantes_imagenes procesa en paralelo las imágenes existentes.
+"""
+import base64
+import io
+import logging
+import os
+import queue
+import threading
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from . import catalogo
+
+logger = logging.getLogger(__name__)
+
+CARPETA = 'destinos/variantes'
+FORMATOS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+ANCHO_MARCADOR = 16
+
+_cola = None
+_pid = None
+_candado = threading.Lock()
+# (destino, imagen) ya encolados en este proceso
+_pendientes = set()
+
+
+def nombre_variante(nombre, ancho, formato):
+    """Nombre en el storage de la variante de `nombre` a `ancho` píxeles."""
+    return f"{CARPETA}/{PurePosixPath(nombre).name}/{ancho}.{formato}"
+
+
+def _plana(imagen):
+    """Copia RGB de `imagen`; la transparencia se rellena de blanco (JPEG no la admite)."""
+    if imagen.mode == 'RGB':
+        return imagen
+    if 'A' in imagen.getbands() or 'transparency' in imagen.info:
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def _guardar(imagen, nombre, formato, **opciones):
+    contenido = io.BytesIO()
+    imagen.save(contenido, FORMATOS[formato], **opciones)
+    default_storage.delete(nombre)
+    return default_storage.save(nombre, ContentFile(contenido.getvalue()))
+
+
+def generar(nombre):
+    """Genera las variantes de la imagen `nombre` del storage y devuelve sus datos.
+
+    No usa la base de datos, así que puede correr en otro proceso.
+    """
+    anchos_pedidos = sorted(set(settings.IMAGENES_ANCHOS))
+    with default_storage.open(nombre, 'rb') as archivo:
+        imagen = Image.open(archivo)
+        # Los JPEG se decodifican directamente a la escala útil más pequeña
+        imagen.draft('RGB', (anchos_pedidos[-1], anchos_pedidos[-1]))
+        imagen = _plana(ImageOps.exif_transpose(imagen))
+
+    ancho, alto = imagen.size
+    datos = {'origen': nombre, 'ancho': ancho, 'alto': alto}
+    for formato in FORMATOS:
+        datos[formato] = []
+    for destino in sorted({min(a, ancho) for a in anchos_pedidos}):
+        copia = imagen
+        if destino < ancho:
+            copia = imagen.resize((destino, max(1, round(alto * destino / ancho))), Image.LANCZOS)
+        for formato in FORMATOS:
+            guardado = _guardar(
+                copia, nombre_variante(nombre, destino, formato), formato,
+                quality=settings.IMAGENES_CALIDAD, optimize=True,
+            )
+            datos[formato].append([guardado, destino])
+
+    marcador = imagen.copy()
+    marcador.thumbnail((ANCHO_MARCADOR, ANCHO_MARCADOR))
+    contenido = io.BytesIO()
+    marcador.save(contenido, 'JPEG', quality=40)
+    datos['marcador'] = 'data:image/jpeg;base64,' + base64.b64encode(contenido.getvalue()).decode()
+    return datos
+
+
+def vigentes(destino):
+    """Datos de las variantes de `destino` si corresponden a su imagen actual, si no None."""
+    datos = destino.imagen_variantes or {}
+    if not destino.imagen or datos.get('origen') != destino.imagen.name:
+        return None
+    return datos
+
+
+def srcset(datos, formato):
+    return ', '.join(
+        f"{default_storage.url(nombre)} {ancho}w" for nombre, ancho in datos[formato]
+    )
+
+
+def guardar_datos(destino_id, datos):
+    """Asocia `datos` al destino si su imagen sigue siendo la misma; sin señales."""
+    from .models import Destino
+    actualizados = Destino.objects.filter(pk=destino_id, imagen=datos['origen']).update(imagen_variantes=datos)
+    if actualizados:
+        catalogo.invalidar()
+    return actualizados
+
+
+def _procesar(cola):
+    while True:
+        destino_id, nombre = cola.get()
+        try:
+            guardar_datos(destino_id, generar(nombre))
+        except Exception:
+            logger.exception("Error generando las variantes de %s", nombre)
+        finally:
+            with _candado:
+                _pendientes.discard((destino_id, nombre))
+            connection.close()
+
+
+def _cola_del_proceso():
+    """Cola de este proceso; el hilo se arranca tras el fork de gunicorn, como en users.eventos."""
+    global _cola, _pid
+    if _pid == os.getpid():
+        return _cola
+    with _candado:
+        if _pid != os.getpid():
+            cola = queue.SimpleQueue()
+            threading.Thread(target=_procesar, args=(cola,), name='imagenes', daemon=True).start()
+            _pendientes.clear()
+            _cola, _pid = cola, os.getpid()
+    return _cola
+
+
+def encolar(destino_id, nombre):
+    """Pide las variantes de la imagen `nombre` del destino sin bloquear al llamador."""
+    cola = _cola_del_proceso()
+    with _candado:
+        if (destino_id, nombre) in _pendientes:
+            return
+        _pendientes.add((destino_id, nombre))
+    cola.put((destino_id, nombre))
+
+
+def programar(destino):
+    """Encola las variantes de `destino` al confirmarse la transacción, si le faltan."""
+    if not destino.imagen or vigentes(destino) is not None:
+        return
+    destino_id, nombre = destino.pk, destino.imagen.name
+    transaction.on_commit(lambda: encolar(destino_id, nombre))
@@ -0,0 +1,219 @@
+"""Inventario de boletos por horario.
+
+Cada par (horario, tipo) tiene una fila en InventarioHorario con los contadores
+libre/carrito/vendido. Quien cambie el estado de boletos debe llamar a `mover`
+dentro de la misma transacción para que los contadores no se desfasen.
+
+Los horarios con `boletos_perezosos` no crean sus boletos por adelantado: los
+asientos sin fila en Boleto se cuentan en `por_emitir` (y también en `libre`) y
+`reclamar` los crea en el momento en que alguien los pone en su carrito.
+"""
+from collections import Counter
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.utils import timezone
+
+from .eventos import registrar
+from .models import Boleto, CarritoBoletos, InventarioHorario
+
+ESTADOS = ('libre', 'carrito', 'vendido')
+
+# Reintentos de `reclamar` cuando la base de datos no soporta SKIP LOCKED y otro
+# comprador se adelanta entre el SELECT y el UPDATE.
+REINTENTOS_RECLAMO = 3
+
+
+class BoletosInsuficientes(ValueError):
+    def __init__(self, solicitados, disponibles):
+        self.solicitados = solicitados
+        self.disponibles = disponibles
+        super().__init__(
+            f"No hay suficientes boletos disponibles. "
+            f"Disponibles: {disponibles}, Se solicitaron: {solicitados}"
+        )
+
+
+class _ReclamoInterrumpido(DatabaseError):
+    pass
+
+
+def crear_boletos(horarios, batch_size=None):
+    """Crea los boletos y las filas de inventario de horarios recién creados.
+
+    Los horarios con `boletos_perezosos` solo reciben su inventario, con toda la
+    capacidad por emitir. Devuelve la cantidad de boletos insertados.
+    """
+    boletos = []
+    filas = []
+    for horario in horarios:
+        for tipo, _ in Boleto.TIPO_CHOICES:
+            capacidad = horario.capacidad(tipo)
+            if horario.boletos_perezosos:
+                filas.append(InventarioHorario(horario=horario, tipo=tipo, libre=capacidad, por_emitir=capacidad))
+                continue
+            precio = horario.destino.precio_vip if tipo == 'vip' else horario.destino.precio_general
+            boletos += [
+                Boleto(tipo=tipo, precio=precio, destino_id=horario.destino_id, horario=horario, estado='libre')
+                for _ in range(capacidad)
+            ]
+            filas.append(InventarioHorario(horario=horario, tipo=tipo, libre=capacidad))
+
+    Boleto.objects.bulk_create(boletos, batch_size=batch_size)
+    InventarioHorario.objects.bulk_create(filas, batch_size=batch_size)
+    return len(boletos)
+
+
+def mover(boletos, desde, hacia):
+    """Registra que `boletos` pasaron del estado `desde` al estado `hacia`.
+
+    `boletos` puede ser un queryset (se agrega en la base de datos) o una lista de
+    instancias de Boleto. Se emite un UPDATE por cada par (horario, tipo) afectado.
+    """
+    if desde not in ESTADOS or hacia not in ESTADOS:
+        raise ValueError(f"Estado de boleto no válido: {desde} -> {hacia}")
+
+    if isinstance(boletos, QuerySet):
+        movimientos = {
+            (fila['horario_id'], fila['tipo']): fila['n']
+            for fila in boletos.order_by().values('horario_id', 'tipo').annotate(n=Count('id'))
+        }
+    else:
+        movimientos = Counter((b.horario_id, b.tipo) for b in boletos)
+
+    with transaction.atomic():
+        for (horario_id, tipo), cantidad in movimientos.items():
+            if not cantidad:
+                continue
+            InventarioHorario.objects.filter(horario_id=horario_id, tipo=tipo).update(**{
+                desde: F(desde) - cantidad,
+                hacia: F(hacia) + cantidad,
+            })
+
+    if movimientos:
+        registrar('boletos.movidos', desde=desde, hacia=hacia, movimientos=[
+            {'horario': horario_id, 'tipo': tipo, 'cantidad': cantidad}
+            for (horario_id, tipo), cantidad in movimientos.items()
+        ])
+
+
+def disponibles(horario, tipo=None):
+    """Boletos libres de un horario, opcionalmente de un solo tipo."""
+    inventario = InventarioHorario.objects.filter(horario=horario)
+    if tipo:
+        inventario = inventario.filter(tipo=tipo)
+    return inventario.aggregate(total=Sum('libre'))['total'] or 0
+
+
+def disponibles_destino(destino_id):
+    return InventarioHorario.objects.filter(
+        horario__destino_id=destino_id
+    ).aggregate(total=Sum('libre'))['total'] or 0
+
+
+def reclamar(carrito, cantidad, tipo=None):
+    """Pasa `cantidad` boletos libres del horario del carrito al estado 'carrito'.
+
+    Los boletos se toman con SELECT ... FOR UPDATE SKIP LOCKED, de modo que dos
+    compradores concurrentes nunca reciben el mismo boleto ni se esperan entre sí.
+    Todo ocurre en una transacción: un UPDATE masivo de estado, un INSERT masivo
+    en la tabla intermedia y un UPDATE de los contadores y totales del carrito.
+    Si no hay suficientes boletos no se reclama ninguno y se lanza
+    BoletosInsuficientes. Devuelve la lista de ids reclamados.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad debe ser al menos 1")
+
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    for intento in range(REINTENTOS_RECLAMO):
+        try:
+            with transaction.atomic():
+                return _reclamar(carrito, cantidad, tipo, skip_locked)
+        except _ReclamoInterrumpido:
+            if intento == REINTENTOS_RECLAMO - 1:
+                raise BoletosInsuficientes(cantidad, disponibles(carrito.horario_id, tipo))
+
+
+def _reclamar(carrito, cantidad, tipo, skip_locked):
+    libres = Boleto.objects.filter(horario_id=carrito.horario_id, estado='libre')
+    if tipo:
+        libres = libres.filter(tipo=tipo)
+    if skip_locked:
+        libres = libres.select_for_update(skip_locked=True)
+
+    filas = list(libres.order_by('id').values_list('id', 'tipo', 'precio')[:cantidad])
+    if len(filas) < cantidad and not carrito.horario.boletos_perezosos:
+        raise BoletosInsuficientes(cantidad, len(filas))
+
+    ids = [boleto_id for boleto_id, _, _ in filas]
+    actualizados = Boleto.objects.filter(id__in=ids, estado='libre').update(estado='carrito')
+    if actualizados != len(ids):
+        # Sin SKIP LOCKED (SQLite) otro comprador pudo ganar alguno de los boletos.
+        raise _ReclamoInterrumpido()
+
+    for tipo_boleto, n in Counter(t for _, t, _ in filas).items():
+        InventarioHorario.objects.filter(horario_id=carrito.horario_id, tipo=tipo_boleto).update(
+            libre=F('libre') - n,
+            carrito=F('carrito') + n,
+        )
+
+    if len(filas) < cantidad:
+        nuevos = _emitir(carrito, cantidad - len(filas), tipo)
+        filas += [(b.pk, b.tipo, b.precio) for b in nuevos]
+        ids += [b.pk for b in nuevos]
+
+    Relacion = CarritoBoletos.boletos.through
+    Relacion.objects.bulk_create([
+        Relacion(carritoboletos_id=carrito.pk, boleto_id=boleto_id) for boleto_id in ids
+    ])
+
+    subtotal = sum(precio for _, _, precio in filas)
+    # Agregar boletos renueva la reserva del carrito (ver users.carritos)
+    CarritoBoletos.objects.filter(pk=carrito.pk).update(
+        cantidad=F('cantidad') + cantidad,
+        total=F('total') + subtotal,
+        fecha_agregado=timezone.now(),
+    )
+    carrito.refresh_from_db(fields=['cantidad', 'total', 'fecha_agregado'])
+    registrar('boletos.reservados', carrito=carrito.pk, usuario=carrito.usuario_id,
+              horario=carrito.horario_id, boletos=ids)
+    return ids
+
+
+def _emitir(carrito, cantidad, tipo):
+    """Crea `cantidad` boletos en estado 'carrito' a partir de los asientos por emitir."""
+    tipos = [tipo] if tipo else [t for t, _ in Boleto.TIPO_CHOICES]
+    por_emitir = dict(
+        InventarioHorario.objects.filter(horario_id=carrito.horario_id, tipo__in=tipos)
+        .values_list('tipo', 'por_emitir')
+    )
+    if sum(por_emitir.values()) < cantidad:
+        raise BoletosInsuficientes(cantidad, disponibles(carrito.horario_id, tipo))
+
+    nuevos = []
+    faltan = cantidad
+    for tipo_boleto in tipos:
+        n = min(faltan, por_emitir.get(tipo_boleto, 0))
+        if not n:
+            continue
+        # El filtro por_emitir__gte impide emitir más asientos que la capacidad
+        tomados = InventarioHorario.objects.filter(
+            horario_id=carrito.horario_id, tipo=tipo_boleto, por_emitir__gte=n
+        ).update(
+            por_emitir=F('por_emitir') - n,
+            libre=F('libre') - n,
+            carrito=F('carrito') + n,
+        )
+        if not tomados:
+            raise _ReclamoInterrumpido()
+        precio = carrito.destino.precio_vip if tipo_boleto == 'vip' else carrito.destino.precio_general
+        nuevos += [
+            Boleto(tipo=tipo_boleto, precio=precio, destino_id=carrito.destino_id,
+                   horario_id=carrito.horario_id, estado='carrito')
+            for _ in range(n)
+        ]
+        faltan -= n
+        if not faltan:
+            break
+
+    return Boleto.objects.bulk_create(nuevos)
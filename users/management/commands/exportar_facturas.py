@@ -0,0 +1,43 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users import facturas
+from users.models import Ventas
+
+
+class Command(BaseCommand):
+    help = "Escribe en un ZIP la factura en PDF de cada venta de un rango de días."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=datetime.date.fromisoformat, required=True, help="Día inicial AAAA-MM-DD.")
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat, required=True, help="Día final AAAA-MM-DD.")
+        parser.add_argument('--salida', help="Archivo ZIP de salida (por defecto facturas_<desde>_<hasta>.zip).")
+        parser.add_argument(
+            '--procesos', type=int, default=settings.FACTURAS_PROCESOS,
+            help="Procesos que generan los PDF que no están en el caché.",
+        )
+        parser.add_argument(
+            '--base-url', default='http://localhost/',
+            help="URL base para resolver las hojas de estilo de la factura.",
+        )
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if hasta < desde:
+            raise CommandError("La fecha final debe ser posterior a la inicial.")
+        salida = options['salida'] or f"facturas_{desde}_{hasta}.zip"
+
+        ventas = Ventas.objects.filter(fecha_compra__date__range=(desde, hasta))
+        inicio = time.monotonic()
+        total = 0
+        with open(salida, 'wb') as archivo:
+            for trozo in facturas.exportar_zip(ventas, options['base_url'], procesos=options['procesos']):
+                archivo.write(trozo)
+                total += len(trozo)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{salida}: {total / (1024 * 1024):.1f} MB en {time.monotonic() - inicio:.1f} s"
+        ))
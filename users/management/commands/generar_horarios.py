@@ -0,0 +1,102 @@
+import argparse
+import calendar
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.horarios import DIAS_SEMANA, generar_recurrentes
+from users.models import Destino
+
+DIAS = {nombre[:3].lower().replace('é', 'e').replace('á', 'a'): numero for numero, nombre in DIAS_SEMANA}
+
+
+def _dia(valor):
+    valor = valor.lower()[:3]
+    if valor.isdigit() and 0 <= int(valor) <= 6:
+        return int(valor)
+    if valor not in DIAS:
+        raise ValueError(valor)
+    return int(DIAS[valor])
+
+
+def _meses_despues(fecha, meses):
+    mes = fecha.month - 1 + meses
+    anio = fecha.year + mes // 12
+    mes = mes % 12 + 1
+    return datetime.date(anio, mes, min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera horarios recurrentes, p. ej. lun/mie/vie a las 08:00 durante 6 meses: "
+        "generar_horarios --destino 1 --destino 2 --dias lun mie vie --hora 08:00 --meses 6"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destino', action='append', type=int, dest='destinos',
+                            help="Id de destino (repetible). Por defecto todos.")
+        parser.add_argument('--dias', nargs='+', required=True,
+                            help="Días de la semana: lun mar mie jue vie sab dom o 0-6.")
+        parser.add_argument('--hora', action='append', required=True, dest='horas',
+                            help="Hora HH:MM (repetible).")
+        parser.add_argument('--desde', type=datetime.date.fromisoformat,
+                            help="Fecha inicial AAAA-MM-DD. Por defecto hoy.")
+        rango = parser.add_mutually_exclusive_group(required=True)
+        rango.add_argument('--hasta', type=datetime.date.fromisoformat, help="Fecha final AAAA-MM-DD.")
+        rango.add_argument('--meses', type=int, help="Meses a partir de la fecha inicial.")
+        parser.add_argument('--capacidad-general', type=int, default=70)
+        parser.add_argument('--capacidad-vip', type=int, default=30)
+        parser.add_argument('--perezosos', action=argparse.BooleanOptionalAction,
+                            default=settings.BOLETOS_PEREZOSOS,
+                            help="Crear los boletos al reservarse en lugar de ahora "
+                                 "(--no-perezosos los crea ya). Por defecto BOLETOS_PEREZOSOS.")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por INSERT.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo muestra cuántos horarios y boletos se crearían.")
+
+    def handle(self, *args, **options):
+        try:
+            dias = [_dia(d) for d in options['dias']]
+        except ValueError as e:
+            raise CommandError(f"Día no válido: {e}")
+        try:
+            horas = [datetime.time.fromisoformat(h) for h in options['horas']]
+        except ValueError as e:
+            raise CommandError(f"Hora no válida: {e}")
+
+        desde = options['desde'] or timezone.localdate()
+        hasta = options['hasta'] or _meses_despues(desde, options['meses'])
+        if hasta < desde:
+            raise CommandError("La fecha final debe ser posterior a la inicial.")
+
+        destinos = Destino.objects.all()
+        if options['destinos']:
+            destinos = destinos.filter(id__in=options['destinos'])
+        destinos = list(destinos)
+        if not destinos:
+            raise CommandError("No hay destinos que coincidan.")
+
+        resumen = generar_recurrentes(
+            destinos=destinos,
+            dias_semana=dias,
+            horas=horas,
+            desde=desde,
+            hasta=hasta,
+            capacidad_general=options['capacidad_general'],
+            capacidad_vip=options['capacidad_vip'],
+            boletos_perezosos=options['perezosos'],
+            dry_run=options['dry_run'],
+            batch_size=options['lote'],
+        )
+
+        for etapa, segundos in resumen['tiempos'].items():
+            self.stdout.write(f"{etapa}: {segundos * 1000:.1f} ms")
+        self.stdout.write(f"Omitidos por choque: {resumen['omitidos']}")
+
+        verbo = "Se crearían" if options['dry_run'] else "Se crearon"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verbo} {resumen['horarios']} horario(s) y {resumen['boletos']} boleto(s) "
+            f"para {len(destinos)} destino(s) entre {desde} y {hasta}."
+        ))
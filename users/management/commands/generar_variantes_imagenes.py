@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from users import imagenes
+from users.models import Destino
+
+
+class Command(BaseCommand):
+    help = "Genera las variantes redimensionadas de las imágenes de los destinos que no las tienen."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help="Procesos que generan variantes en paralelo.",
+        )
+        parser.add_argument(
+            '--todas', action='store_true',
+            help="Regenera también las imágenes que ya tienen variantes (p. ej. tras cambiar IMAGENES_ANCHOS).",
+        )
+
+    def handle(self, *args, **options):
+        destinos = {}
+        for destino in Destino.objects.exclude(imagen='').exclude(imagen__isnull=True).only('imagen', 'imagen_variantes'):
+            if options['todas'] or imagenes.vigentes(destino) is None:
+                destinos.setdefault(destino.imagen.name, []).append(destino.pk)
+
+        faltantes = [nombre for nombre in destinos if not default_storage.exists(nombre)]
+        for nombre in faltantes:
+            self.stderr.write(f"No existe {nombre}")
+            del destinos[nombre]
+
+        inicio = time.monotonic()
+        generadas = errores = 0
+        # spawn: los procesos no heredan la conexión a la base de datos
+        with ProcessPoolExecutor(
+            max_workers=max(1, options['procesos']),
+            mp_context=multiprocessing.get_context('spawn'),
+        ) as pool:
+            futuros = {pool.submit(imagenes.generar, nombre): nombre for nombre in destinos}
+            for futuro in as_completed(futuros):
+                nombre = futuros[futuro]
+                try:
+                    datos = futuro.result()
+                except Exception as error:
+                    errores += 1
+                    self.stderr.write(f"{nombre}: {error!r}")
+                    continue
+                for destino_id in destinos[nombre]:
+                    imagenes.guardar_datos(destino_id, datos)
+                generadas += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{generadas} imágenes procesadas, {errores} con errores y {len(faltantes)} sin archivo "
+            f"en {time.monotonic() - inicio:.1f} s"
+        ))
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users import carritos
+
+
+class Command(BaseCommand):
+    help = "Libera los boletos y elimina los paquetes de carritos más viejos que CARRITO_TTL_MINUTOS."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl', type=int, default=settings.CARRITO_TTL_MINUTOS,
+            help="Minutos que dura una reserva en carrito.",
+        )
+        parser.add_argument(
+            '--lote', type=int, default=settings.CARRITO_LIMPIEZA_LOTE,
+            help="Filas procesadas por transacción.",
+        )
+        parser.add_argument(
+            '--cada', type=int, default=settings.CARRITO_LIMPIEZA_INTERVALO,
+            help="Repite la limpieza cada estos segundos sin terminar (0 = una sola pasada, para cron).",
+        )
+
+    def handle(self, *args, **options):
+        opciones = {'ttl_minutos': options['ttl'], 'lote': options['lote']}
+        if options['cada']:
+            for lotes in carritos.liberar_cada(options['cada'], **opciones):
+                self._informar(lotes)
+        else:
+            self._informar(carritos.liberar_vencidos(**opciones))
+
+    def _informar(self, lotes):
+        for lote in lotes:
+            self.stdout.write(
+                f"{lote['tipo']} lote {lote['lote']}: {lote['filas']} filas en {lote['segundos'] * 1000:.1f} ms"
+            )
+
+        total = sum(lote['filas'] for lote in lotes)
+        segundos = sum(lote['segundos'] for lote in lotes)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} filas liberadas en {len(lotes)} lote(s), {segundos * 1000:.1f} ms"
+        ))
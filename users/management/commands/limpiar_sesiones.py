@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from users import sesiones
+
+
+class Command(BaseCommand):
+    help = "Borra las sesiones vencidas por lotes, sin bloquear la tabla de sesiones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Sesiones borradas por transacción.")
+        parser.add_argument(
+            '--pausa', type=float, default=0.1,
+            help="Segundos de espera entre lotes, para dejar pasar a las peticiones.",
+        )
+
+    def handle(self, *args, **options):
+        borradas = sesiones.limpiar(lote=options['lote'], pausa=options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f"{borradas} sesión(es) vencidas borradas"))
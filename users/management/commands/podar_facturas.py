@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users import facturas
+
+
+class Command(BaseCommand):
+    help = "Borra del caché de facturas los PDF sin usar hace tiempo o que exceden el tamaño máximo."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-mb', type=int, default=settings.FACTURAS_CACHE_MAX_BYTES // (1024 * 1024),
+            help="Tamaño máximo del caché en MB.",
+        )
+        parser.add_argument(
+            '--max-dias', type=int, default=settings.FACTURAS_CACHE_MAX_DIAS,
+            help="Días sin usarse tras los que se borra un PDF.",
+        )
+
+    def handle(self, *args, **options):
+        borrados, liberados = facturas.podar(
+            max_bytes=options['max_mb'] * 1024 * 1024, max_dias=options['max_dias'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{borrados} archivo(s) borrados, {liberados / (1024 * 1024):.1f} MB liberados"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from users import almacenamiento
+
+
+class Command(BaseCommand):
+    help = "Borra las imágenes subidas que ningún destino ni pago referencia."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int, default=24,
+            help="Solo borra archivos sin tocar desde hace estas horas (protege las subidas en curso).",
+        )
+        parser.add_argument(
+            '--migrar', action='store_true',
+            help="Antes, guarda por contenido los archivos subidos con el esquema anterior.",
+        )
+        parser.add_argument(
+            '--legado', action='store_true',
+            help="Borra también los archivos sin referencia del esquema anterior (nombre_XXXXXXX.jpg).",
+        )
+        parser.add_argument('--simular', action='store_true', help="Informa sin borrar ni migrar nada.")
+
+    def handle(self, *args, **options):
+        if options['migrar']:
+            migrados = almacenamiento.migrar(simular=options['simular'])
+            self.stdout.write(f"{migrados} archivo(s) pasados al almacenamiento por contenido")
+        borrados, liberados = almacenamiento.recolectar(
+            horas=options['horas'], legado=options['legado'], simular=options['simular'],
+        )
+        accion = "se borrarían" if options['simular'] else "borrados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{borrados} archivo(s) {accion}, {liberados / (1024 * 1024):.1f} MB"
+        ))
@@ -0,0 +1,35 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from users import reportes
+from users.models import Ventas
+
+
+class Command(BaseCommand):
+    help = "Recalcula VentasResumenDiario desde Ventas para un rango de días (por defecto todo el historial)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=datetime.date.fromisoformat, help="Día inicial AAAA-MM-DD.")
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat, help="Día final AAAA-MM-DD.")
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde is None or hasta is None:
+            rango = Ventas.objects.aggregate(primera=Min('fecha_compra'), ultima=Max('fecha_compra'))
+            if rango['primera'] is None:
+                self.stdout.write("No hay ventas registradas.")
+                return
+            desde = desde or timezone.localdate(rango['primera'])
+            hasta = hasta or timezone.localdate(rango['ultima'])
+        if hasta < desde:
+            raise CommandError("La fecha final debe ser posterior a la inicial.")
+
+        inicio = time.monotonic()
+        filas = reportes.reconstruir(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} fila(s) de resumen entre {desde} y {hasta} en {(time.monotonic() - inicio) * 1000:.1f} ms"
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import busqueda
+from users.models import Ventas
+
+
+class Command(BaseCommand):
+    help = "Recalcula el documento de búsqueda de las ventas (Ventas.busqueda y VentaTermino)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Ventas indexadas por transacción.")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        total = busqueda.reindexar(Ventas.objects.all(), lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} venta(s) indexadas en {(time.monotonic() - inicio) * 1000:.1f} ms"
+        ))
@@ -0,0 +1,185 @@
+"""Entrega de los archivos de MEDIA_ROOT con control de acceso.
+
+Las imágenes de destinos son públicas; los comprobantes de pago solo los ven
+los administradores y el dueño del pago. Comprobado el permiso, el envío del
+archivo se delega al proxy según MEDIOS_ENVIO:
+
+- 'x-accel-redirect' (nginx): se responde con la ruta interna
+  MEDIOS_PREFIJO_INTERNO + nombre y nginx sirve el archivo.
+- 'x-sendfile' (Apache/lighttpd): se responde con la ruta absoluta.
+- vacío: un FileResponse sobre el archivo abierto, que gunicorn manda con
+  sendfile() sin pasar por Python, también para las peticiones Range.
+
+Los archivos guardados por contenido (users.almacenamiento) no cambian nunca,
+así que los públicos se cachean un año; el resto lleva ETag y Last-Modified
+para responder 304.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .almacenamiento import es_blob
+
+PRIVADOS = ('comprobantes/',)
+UN_ANIO = 365 * 24 * 3600
+UN_DIA = 24 * 3600
+
+_RANGO = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class _Tramo:
+    """Lee solo `largo` bytes de `archivo` desde su posición actual.
+
+    Conserva fileno() para que gunicorn pueda usar sendfile() con el
+    Content-Length del tramo.
+    """
+
+    def __init__(self, archivo, largo):
+        self.archivo = archivo
+        self.restante = largo
+
+    def read(self, n=-1):
+        if self.restante <= 0:
+            return b''
+        n = self.restante if n is None or n < 0 else min(n, self.restante)
+        datos = self.archivo.read(n)
+        self.restante -= len(datos)
+        return datos
+
+    def fileno(self):
+        return self.archivo.fileno()
+
+    def close(self):
+        self.archivo.close()
+
+
+def limpio(nombre):
+    """`nombre` si es una ruta relativa sin segmentos '.', '..' ni vacíos; si no, None.
+
+    El permiso se decide sobre el nombre tal como se va a abrir: con
+    'destinos/../comprobantes/…' el prefijo no diría que es privado.
+    """
+    if not nombre or '\x00' in nombre or nombre.startswith('/'):
+        return None
+    if any(segmento in ('', '.', '..') for segmento in nombre.split('/')):
+        return None
+    if posixpath.normpath(nombre) != nombre:
+        return None
+    return nombre
+
+
+def privado(nombre):
+    return nombre.startswith(PRIVADOS)
+
+
+def puede_ver(usuario, nombre):
+    """True si `usuario` puede descargar el archivo `nombre` de MEDIA_ROOT."""
+    nombre = limpio(nombre)
+    if nombre is None:
+        return False
+    if not privado(nombre):
+        return True
+    if not usuario.is_authenticated:
+        return False
+    if usuario.rol == 'admin':
+        return True
+    from .models import Pago
+    return Pago.objects.filter(comprobante=nombre, usuario=usuario).exists()
+
+
+def _cache_control(nombre):
+    if privado(nombre):
+        return 'private, no-cache'
+    if es_blob(nombre):
+        return f'public, max-age={UN_ANIO}, immutable'
+    return f'public, max-age={UN_DIA}'
+
+
+def _rango(cabecera, tamano):
+    """(inicio, fin) de un Range de un solo tramo; None si no aplica y () si es insatisfacible."""
+    m = _RANGO.match(cabecera.replace(' ', ''))
+    if not m or not (m[1] or m[2]):
+        return None
+    if not m[1]:
+        largo = int(m[2])
+        if largo == 0:
+            return ()
+        return max(0, tamano - largo), tamano - 1
+    inicio = int(m[1])
+    fin = min(int(m[2]), tamano - 1) if m[2] else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return ()
+    return inicio, fin
+
+
+def respuesta(request, nombre):
+    """Respuesta que entrega el archivo `nombre` de MEDIA_ROOT (ya autorizado)."""
+    nombre = limpio(nombre)
+    if nombre is None:
+        raise Http404
+    try:
+        ruta = safe_join(settings.MEDIA_ROOT, nombre)
+        info = os.stat(ruta)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not os.path.isfile(ruta):
+        raise Http404
+
+    etag = '"%x-%x"' % (info.st_mtime_ns, info.st_size)
+    cabeceras = {
+        'ETag': etag,
+        'Last-Modified': http_date(info.st_mtime),
+        'Cache-Control': _cache_control(nombre),
+        'Accept-Ranges': 'bytes',
+    }
+    no_modificada = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if no_modificada is not None:
+        for clave, valor in cabeceras.items():
+            no_modificada[clave] = valor
+        return no_modificada
+
+    tipo = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+    envio = settings.MEDIOS_ENVIO
+    if envio in ('x-accel-redirect', 'x-sendfile'):
+        response = HttpResponse(content_type=tipo)
+        if envio == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = quote(settings.MEDIOS_PREFIJO_INTERNO + nombre)
+        else:
+            response['X-Sendfile'] = ruta
+        cabeceras.pop('Accept-Ranges')
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=tipo)
+        response['Content-Length'] = info.st_size
+    else:
+        tramo = None
+        cabecera_rango = request.headers.get('Range')
+        si_rango = request.headers.get('If-Range')
+        if cabecera_rango and (not si_rango or si_rango == etag):
+            tramo = _rango(cabecera_rango, info.st_size)
+        if tramo == ():
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{info.st_size}'
+            return response
+
+        archivo = open(ruta, 'rb')
+        if tramo:
+            inicio, fin = tramo
+            archivo.seek(inicio)
+            response = FileResponse(_Tramo(archivo, fin - inicio + 1), status=206, content_type=tipo)
+            response['Content-Length'] = fin - inicio + 1
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{info.st_size}'
+        else:
+            response = FileResponse(archivo, content_type=tipo)
+
+    for clave, valor in cabeceras.items():
+        response[clave] = valor
+    return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_inventario(apps, schema_editor):
+    Horario = apps.get_model('users', 'Horario')
+    Boleto = apps.get_model('users', 'Boleto')
+    InventarioHorario = apps.get_model('users', 'InventarioHorario')
+
+    filas = {
+        (horario_id, tipo): InventarioHorario(horario_id=horario_id, tipo=tipo)
+        for horario_id in Horario.objects.values_list('id', flat=True)
+        for tipo in ('general', 'vip')
+    }
+    conteos = Boleto.objects.values('horario_id', 'tipo', 'estado').annotate(n=Count('id'))
+    for fila in conteos:
+        inventario = filas.get((fila['horario_id'], fila['tipo']))
+        if inventario is not None:
+            setattr(inventario, fila['estado'], fila['n'])
+
+    InventarioHorario.objects.bulk_create(filas.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventarioHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('general', 'General'), ('vip', 'VIP')], max_length=20)),
+                ('libre', models.PositiveIntegerField(default=0)),
+                ('carrito', models.PositiveIntegerField(default=0)),
+                ('vendido', models.PositiveIntegerField(default=0)),
+                ('horario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventario', to='users.horario')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='inventariohorario',
+            constraint=models.UniqueConstraint(fields=('horario', 'tipo'), name='inventario_horario_tipo_unico'),
+        ),
+        migrations.RunPython(poblar_inventario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:34
+
+import users.models
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def capacidad_desde_boletos(apps, schema_editor):
+    # Los horarios existentes ya tienen todos sus boletos creados
+    Horario = apps.get_model('users', 'Horario')
+    Boleto = apps.get_model('users', 'Boleto')
+
+    horarios = {h.pk: h for h in Horario.objects.all()}
+    for horario in horarios.values():
+        horario.boletos_perezosos = False
+        horario.capacidad_general = 0
+        horario.capacidad_vip = 0
+
+    for fila in Boleto.objects.values('horario_id', 'tipo').annotate(n=Count('id')):
+        horario = horarios.get(fila['horario_id'])
+        if horario is not None:
+            setattr(horario, f"capacidad_{fila['tipo']}", fila['n'])
+
+    Horario.objects.bulk_update(
+        horarios.values(),
+        ['boletos_perezosos', 'capacidad_general', 'capacidad_vip'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_inventario_horario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='horario',
+            name='boletos_perezosos',
+            field=models.BooleanField(default=users.models._boletos_perezosos_por_defecto, help_text='Crear cada boleto solo cuando alguien lo reserva, en lugar de todos al crear el horario'),
+        ),
+        migrations.AddField(
+            model_name='horario',
+            name='capacidad_general',
+            field=models.PositiveIntegerField(default=70),
+        ),
+        migrations.AddField(
+            model_name='horario',
+            name='capacidad_vip',
+            field=models.PositiveIntegerField(default=30),
+        ),
+        migrations.AddField(
+            model_name='inventariohorario',
+            name='por_emitir',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(capacidad_desde_boletos, migrations.RunPython.noop),
+    ]
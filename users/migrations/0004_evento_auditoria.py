@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_horario_capacidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('evento', models.CharField(db_index=True, max_length=50)),
+                ('datos', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
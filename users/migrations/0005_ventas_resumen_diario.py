@@ -0,0 +1,60 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:39
+
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_resumen(apps, schema_editor):
+    Ventas = apps.get_model('users', 'Ventas')
+    VentasResumenDiario = apps.get_model('users', 'VentasResumenDiario')
+
+    num_boletos = Counter(Ventas.boletos.through.objects.values_list('ventas_id', flat=True))
+    num_paquetes = Counter(Ventas.paquetes.through.objects.values_list('ventas_id', flat=True))
+
+    resumen = defaultdict(lambda: {'ventas': 0, 'boletos': 0, 'paquetes': 0, 'mixtas': 0, 'ingresos': Decimal('0')})
+    for venta_id, destino_id, fecha, total in Ventas.objects.values_list(
+        'id', 'destino_id', 'fecha_compra', 'total_pagado'
+    ).iterator():
+        fila = resumen[(timezone.localdate(fecha), destino_id)]
+        fila['ventas'] += 1
+        fila['boletos'] += num_boletos[venta_id]
+        fila['paquetes'] += num_paquetes[venta_id]
+        fila['mixtas'] += 1 if num_boletos[venta_id] and num_paquetes[venta_id] else 0
+        fila['ingresos'] += total
+
+    VentasResumenDiario.objects.bulk_create([
+        VentasResumenDiario(dia=dia, destino_id=destino_id, **valores)
+        for (dia, destino_id), valores in resumen.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_evento_auditoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentasResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ventas', models.PositiveIntegerField(default=0)),
+                ('boletos', models.PositiveIntegerField(default=0)),
+                ('paquetes', models.PositiveIntegerField(default=0)),
+                ('mixtas', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('destino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_ventas', to='users.destino')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ventasresumendiario',
+            constraint=models.UniqueConstraint(fields=('dia', 'destino'), name='resumen_ventas_dia_destino_unico'),
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_ventas_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['fecha_compra', 'id'], name='ventas_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['usuario', 'fecha_compra', 'id'], name='ventas_usuario_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:44
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia de users.busqueda.documento al crearse esta migración, para que cambios
+# posteriores allí no alteren lo que hace
+_PALABRA = re.compile(r'[^\W_]+')
+
+
+def documento(destino, nombre, cedula):
+    texto = unicodedata.normalize('NFKD', f'{destino} {nombre} {cedula}')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(_PALABRA.findall(texto))
+
+
+INDICES_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ventas_busqueda_tsv_idx ON users_ventas "
+    "USING gin (to_tsvector('simple'::regconfig, COALESCE(busqueda, '')))",
+    "CREATE INDEX IF NOT EXISTS ventas_busqueda_trgm_idx ON users_ventas "
+    "USING gin (busqueda gin_trgm_ops)",
+]
+
+
+def crear_indices_postgres(apps, schema_editor):
+    # Los índices GIN no existen en SQLite; ahí se usa VentaTermino
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in INDICES_POSTGRES:
+            schema_editor.execute(sql)
+
+
+def borrar_indices_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS ventas_busqueda_trgm_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS ventas_busqueda_tsv_idx")
+
+
+def poblar_busqueda(apps, schema_editor):
+    Ventas = apps.get_model('users', 'Ventas')
+    VentaTermino = apps.get_model('users', 'VentaTermino')
+    postgres = schema_editor.connection.vendor == 'postgresql'
+
+    filas = Ventas.objects.order_by('pk').values_list(
+        'id', 'destino__nombre', 'usuario__nombre', 'usuario__cedula'
+    )
+    ventas = [
+        Ventas(pk=venta_id, busqueda=documento(destino, nombre, cedula))
+        for venta_id, destino, nombre, cedula in filas.iterator()
+    ]
+    Ventas.objects.bulk_update(ventas, ['busqueda'], batch_size=1000)
+    if not postgres:
+        VentaTermino.objects.bulk_create([
+            VentaTermino(venta_id=venta.pk, termino=termino[:100])
+            for venta in ventas
+            for termino in set(venta.busqueda.split())
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_ventas_indices_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaTermino',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ventas',
+            name='busqueda',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['total_pagado'], name='ventas_total_pagado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['cantidad'], name='ventas_cantidad_idx'),
+        ),
+        migrations.AddField(
+            model_name='ventatermino',
+            name='venta',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='users.ventas'),
+        ),
+        migrations.AddConstraint(
+            model_name='ventatermino',
+            constraint=models.UniqueConstraint(fields=('termino', 'venta'), name='venta_termino_unico'),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_postgres, borrar_indices_postgres),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:52
+
+from django.db import migrations
+
+# La cédula no necesita índice nuevo: al ser única, PostgreSQL ya tiene su
+# índice varchar_pattern_ops (_like), que sirve para la búsqueda por prefijo.
+INDICES_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS usuario_nombre_trgm_idx ON users_usuario "
+    "USING gin (UPPER(nombre) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS usuario_email_trgm_idx ON users_usuario "
+    "USING gin (UPPER(email) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS usuario_email_prefijo_idx ON users_usuario "
+    "(UPPER(email) text_pattern_ops)",
+]
+
+
+def crear_indices_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in INDICES_POSTGRES:
+            schema_editor.execute(sql)
+
+
+def borrar_indices_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for indice in ('usuario_email_prefijo_idx', 'usuario_email_trgm_idx', 'usuario_nombre_trgm_idx'):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {indice}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_busqueda_ventas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_postgres, borrar_indices_postgres),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def comprobar_telefonos_repetidos(apps, schema_editor):
+    # No se corrigen datos a ciegas: si hay teléfonos repetidos hay que resolverlos a mano
+    Usuario = apps.get_model('users', 'Usuario')
+    repetidos = list(
+        Usuario.objects.values('telefono').annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('telefono', flat=True)[:20]
+    )
+    if repetidos:
+        raise RuntimeError(
+            "Hay usuarios que comparten teléfono; corríjalos antes de migrar: " + ", ".join(repetidos)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_usuarios_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(comprobar_telefonos_repetidos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='usuario',
+            name='telefono',
+            field=models.CharField(max_length=15, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_usuario_telefono_unico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destino',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
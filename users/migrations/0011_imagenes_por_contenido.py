@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:57
+
+import users.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_destino_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='destino',
+            name='imagen',
+            field=models.ImageField(blank=True, null=True, storage=users.almacenamiento.AlmacenamientoPorContenido(), upload_to='destinos/'),
+        ),
+        migrations.AlterField(
+            model_name='pago',
+            name='comprobante',
+            field=models.ImageField(blank=True, null=True, storage=users.almacenamiento.AlmacenamientoPorContenido(), upload_to='comprobantes/'),
+        ),
+    ]
@@ -3,6 +3,10 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from .managers import UsuarioManager
 from django.utils import timezone
 from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from . import imagenes
+from .almacenamiento import por_contenido
 
 class Usuario(AbstractBaseUser, PermissionsMixin):
     ROLES = [
@@ -15,7 +19,7 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     cedula = models.CharField(max_length=20, unique=True)
     nombre = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
-    telefono = models.CharField(max_length=15)
+    telefono = models.CharField(max_length=15, unique=True)
     rol = models.CharField(max_length=10, choices=ROLES)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -29,6 +33,13 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         return f"{self.nombre} ({self.rol})"
 
 
+class DestinoQuerySet(models.QuerySet):
+    def con_disponibilidad(self):
+        return self.annotate(
+            boletos_libres=Coalesce(Sum('horarios__inventario__libre'), 0)
+        )
+
+
 class Destino(models.Model):
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
@@ -37,7 +48,9 @@ class Destino(models.Model):
         choices=[('aereo', 'Aéreo'), ('maritimo', 'Marítimo')],
         default='aereo'
     )
-    imagen = models.ImageField(upload_to='destinos/', null=True, blank=True)
+    imagen = models.ImageField(upload_to='destinos/', storage=por_contenido, null=True, blank=True)
+    # Variantes redimensionadas de `imagen` (users.imagenes); vacío mientras no se generan
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
     precio_general = models.DecimalField(max_digits=10, decimal_places=2, default=0)  
     precio_vip = models.DecimalField(max_digits=10, decimal_places=2, default=0)  
     
@@ -61,18 +74,51 @@ class Destino(models.Model):
         help_text="Peso base en kg para el cálculo del envío"
     )
 
+    objects = DestinoQuerySet.as_manager()
+
     @property
     def boletos_disponibles(self):
-        return Boleto.objects.filter(destino=self, estado='libre').count()
+        # Los listados anotan `boletos_libres` con Destino.objects.con_disponibilidad()
+        if hasattr(self, 'boletos_libres'):
+            return self.boletos_libres
+        return InventarioHorario.objects.filter(
+            horario__destino=self
+        ).aggregate(total=Sum('libre'))['total'] or 0
+
+    @property
+    def imagen_responsive(self):
+        """srcset WebP y JPEG, marcador y URL de respaldo de la imagen, o None si aún no hay variantes."""
+        datos = imagenes.vigentes(self)
+        if datos is None:
+            return None
+        return {
+            'webp': imagenes.srcset(datos, 'webp'),
+            'jpeg': imagenes.srcset(datos, 'jpeg'),
+            'src': self.imagen.storage.url(datos['jpeg'][-1][0]),
+            'marcador': datos['marcador'],
+        }
 
     def __str__(self):
         return f"{self.nombre} - {self.get_transporte_display()}"
 
 
+def _boletos_perezosos_por_defecto():
+    return settings.BOLETOS_PEREZOSOS
+
+
 class Horario(models.Model):
     destino = models.ForeignKey(Destino, on_delete=models.CASCADE, related_name='horarios')
     fecha = models.DateField()
     hora = models.TimeField()
+    capacidad_general = models.PositiveIntegerField(default=70)
+    capacidad_vip = models.PositiveIntegerField(default=30)
+    boletos_perezosos = models.BooleanField(
+        default=_boletos_perezosos_por_defecto,
+        help_text="Crear cada boleto solo cuando alguien lo reserva, en lugar de todos al crear el horario"
+    )
+
+    def capacidad(self, tipo):
+        return self.capacidad_vip if tipo == 'vip' else self.capacidad_general
 
     def __str__(self):
         return f"{self.destino.nombre} - {self.fecha} {self.hora.strftime('%H:%M')}"
@@ -107,14 +153,29 @@ class Boleto(models.Model):
         return f"{self.get_tipo_display()} a {self.destino.nombre} - {self.horario.fecha} {self.horario.hora} - ${self.precio}"
 
     def save(self, *args, **kwargs):
-        if not self.pk:
-            print("🚨 Boleto creado:", self, flush=True)
-        else:
-            print("✏️ Boleto modificado:", self, flush=True)
+        from .eventos import registrar
+        evento = 'boleto.creado' if not self.pk else 'boleto.modificado'
         super().save(*args, **kwargs)
+        registrar(evento, boleto=self.pk, horario=self.horario_id, tipo=self.tipo, estado=self.estado)
 
 
+class InventarioHorario(models.Model):
+    """Contadores de boletos por horario y tipo, mantenidos junto a cada cambio de estado."""
+    horario = models.ForeignKey(Horario, on_delete=models.CASCADE, related_name='inventario')
+    tipo = models.CharField(max_length=20, choices=Boleto.TIPO_CHOICES)
+    libre = models.PositiveIntegerField(default=0)
+    carrito = models.PositiveIntegerField(default=0)
+    vendido = models.PositiveIntegerField(default=0)
+    # Asientos libres que aún no tienen fila en Boleto (horarios con boletos_perezosos)
+    por_emitir = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['horario', 'tipo'], name='inventario_horario_tipo_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.horario} ({self.tipo}): {self.libre} libres, {self.carrito} en carrito, {self.vendido} vendidos"
 
 
 class CarritoBoletos(models.Model):
@@ -153,6 +214,33 @@ class CarritoPaquetes(models.Model):
     def __str__(self):
         return f"{self.usuario.nombre} - {self.paquetes.count()} paquete(s) a {self.destino.nombre}"
 
+class VentasQuerySet(models.QuerySet):
+    @staticmethod
+    def _items(relacion):
+        through = getattr(Ventas, relacion).through
+        return through.objects.filter(ventas_id=OuterRef('pk')).order_by()
+
+    def con_conteos(self):
+        """Anota num_boletos y num_paquetes con subconsultas sobre las tablas intermedias."""
+        def conteo(relacion):
+            items = self._items(relacion).values('ventas_id').annotate(n=Count('*')).values('n')
+            return Coalesce(Subquery(items, output_field=models.IntegerField()), 0)
+
+        return self.annotate(num_boletos=conteo('boletos'), num_paquetes=conteo('paquetes'))
+
+    def de_tipo(self, tipo):
+        """Filtra ventas 'boletos', 'paquetes' o 'mixta' sin duplicar filas."""
+        con_boletos = Exists(self._items('boletos'))
+        con_paquetes = Exists(self._items('paquetes'))
+        if tipo == 'boletos':
+            return self.filter(con_boletos, ~con_paquetes)
+        if tipo == 'paquetes':
+            return self.filter(con_paquetes, ~con_boletos)
+        if tipo == 'mixta':
+            return self.filter(con_boletos, con_paquetes)
+        return self
+
+
 class Ventas(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     destino = models.ForeignKey(Destino, on_delete=models.CASCADE)
@@ -160,10 +248,24 @@ class Ventas(models.Model):
     hora = models.TimeField(default=timezone.now)
     fecha_compra = models.DateTimeField(auto_now_add=True)
     total_pagado = models.DecimalField(max_digits=10, decimal_places=2)
+    # Destino, nombre y cédula del comprador normalizados; lo mantiene users.busqueda
+    busqueda = models.TextField(default='', editable=False)
 
     boletos = models.ManyToManyField(Boleto, blank=True)
     paquetes = models.ManyToManyField('Paquete', blank=True)  
 
+    objects = VentasQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Paginación por cursor de historial_ventas (users.paginacion)
+            models.Index(fields=['fecha_compra', 'id'], name='ventas_fecha_id_idx'),
+            models.Index(fields=['usuario', 'fecha_compra', 'id'], name='ventas_usuario_fecha_id_idx'),
+            # Términos numéricos de la búsqueda (users.busqueda)
+            models.Index(fields=['total_pagado'], name='ventas_total_pagado_idx'),
+            models.Index(fields=['cantidad'], name='ventas_cantidad_idx'),
+        ]
+
     def __str__(self):
         items = []
         if self.boletos.exists():
@@ -173,6 +275,40 @@ class Ventas(models.Model):
         return f"{self.usuario.nombre} compró {' y '.join(items)} a {self.destino.nombre} por ${self.total_pagado}"
 
 
+class VentaTermino(models.Model):
+    """Palabra del documento de búsqueda de una venta.
+
+    Solo se usa fuera de PostgreSQL, donde no hay índices tsvector ni trigram:
+    la búsqueda por prefijo se hace con un rango sobre el índice único.
+    """
+    venta = models.ForeignKey(Ventas, on_delete=models.CASCADE, related_name='terminos')
+    termino = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['termino', 'venta'], name='venta_termino_unico'),
+        ]
+
+
+class VentasResumenDiario(models.Model):
+    """Totales de ventas por día y destino, mantenidos por users.reportes."""
+    dia = models.DateField()
+    destino = models.ForeignKey(Destino, on_delete=models.CASCADE, related_name='resumen_ventas')
+    ventas = models.PositiveIntegerField(default=0)
+    boletos = models.PositiveIntegerField(default=0)
+    paquetes = models.PositiveIntegerField(default=0)
+    mixtas = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'destino'], name='resumen_ventas_dia_destino_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} {self.destino.nombre}: {self.ventas} venta(s), ${self.ingresos}"
+
+
 class Pago(models.Model):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
@@ -203,7 +339,7 @@ class Pago(models.Model):
         help_text="Campo sin uso para Pago Móvil"
     )
     observaciones = models.TextField(blank=True, null=True)
-    comprobante = models.ImageField(upload_to='comprobantes/', blank=True, null=True)
+    comprobante = models.ImageField(upload_to='comprobantes/', storage=por_contenido, blank=True, null=True)
     estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
     fecha_verificacion = models.DateTimeField(blank=True, null=True)
 
@@ -289,4 +425,14 @@ class CosteEnvio(models.Model):
     )
 
     def __str__(self):
-        return f"Costo adicional para {self.destino.nombre}: ${self.costo_adicional}"
\ No newline at end of file
+        return f"Costo adicional para {self.destino.nombre}: ${self.costo_adicional}"
+
+
+class EventoAuditoria(models.Model):
+    """Registro de solo inserción de los eventos de users.eventos."""
+    fecha = models.DateTimeField(db_index=True)
+    evento = models.CharField(max_length=50, db_index=True)
+    datos = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.fecha:%Y-%m-%d %H:%M:%S} {self.evento}"
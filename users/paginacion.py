@@ -0,0 +1,124 @@
+"""Paginación por cursor (keyset) para listados grandes.
+
+En lugar de COUNT(*) y OFFSET, cada página se pide como "las filas que siguen a
+esta clave" en el orden de `campos`, así que la página 100 cuesta lo mismo que
+la primera. Los cursores son opacos: la clave de la fila límite y la dirección,
+en JSON codificado en base64.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class PaginaCursor:
+    """Página de resultados con los cursores para ir a la anterior y la siguiente."""
+
+    def __init__(self, objetos, cursor_anterior, cursor_siguiente):
+        self.object_list = objetos
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+
+def _campo(nombre):
+    return nombre.lstrip('-'), nombre.startswith('-')
+
+
+def _codificar(modelo, campos, objeto, direccion):
+    valores = [
+        modelo._meta.get_field(nombre).value_to_string(objeto)
+        for nombre, _ in map(_campo, campos)
+    ]
+    datos = json.dumps({'d': direccion, 'v': valores}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def _decodificar(modelo, campos, cursor):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direccion, valores = datos['d'], datos['v']
+        if direccion not in ('sig', 'ant') or len(valores) != len(campos):
+            raise CursorInvalido(cursor)
+        valores = [
+            modelo._meta.get_field(nombre).to_python(valor)
+            for (nombre, _), valor in zip(map(_campo, campos), valores)
+        ]
+    except (binascii.Error, ValueError, TypeError, KeyError, ValidationError, FieldDoesNotExist):
+        raise CursorInvalido(cursor)
+    return direccion, valores
+
+
+def _despues_de(campos, valores, invertir):
+    """Q de las filas posteriores a `valores` en el orden de `campos`.
+
+    Para (a, b) ascendente es a > va OR (a = va AND b > vb).
+    """
+    condicion = Q()
+    iguales = {}
+    for (nombre, descendente), valor in zip(map(_campo, campos), valores):
+        operador = 'lt' if descendente != invertir else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def _invertido(campos):
+    return [nombre[1:] if nombre.startswith('-') else f'-{nombre}' for nombre in campos]
+
+
+def paginar(queryset, campos, cursor=None, por_pagina=10):
+    """Devuelve la PaginaCursor de `queryset` ordenado por `campos` indicada por `cursor`.
+
+    `campos` debe terminar en una columna única (normalmente 'id' o '-id') para
+    que el orden sea total. Un cursor vacío o inválido devuelve la primera página.
+    """
+    modelo = queryset.model
+    direccion, valores = 'sig', None
+    if cursor:
+        try:
+            direccion, valores = _decodificar(modelo, campos, cursor)
+        except CursorInvalido:
+            pass
+
+    hacia_atras = direccion == 'ant' and valores is not None
+    orden = _invertido(campos) if hacia_atras else list(campos)
+    qs = queryset.order_by(*orden)
+    if valores is not None:
+        qs = qs.filter(_despues_de(campos, valores, invertir=hacia_atras))
+
+    objetos = list(qs[:por_pagina + 1])
+    hay_mas = len(objetos) > por_pagina
+    objetos = objetos[:por_pagina]
+    if hacia_atras:
+        objetos.reverse()
+
+    if not objetos:
+        return PaginaCursor(objetos, None, None)
+
+    # Hacia adelante, hay página anterior si se llegó con un cursor; hacia atrás,
+    # siempre hay siguiente (la página desde la que se volvió).
+    hay_anterior = hay_mas if hacia_atras else valores is not None
+    hay_siguiente = True if hacia_atras else hay_mas
+    return PaginaCursor(
+        objetos,
+        _codificar(modelo, campos, objetos[0], 'ant') if hay_anterior else None,
+        _codificar(modelo, campos, objetos[-1], 'sig') if hay_siguiente else None,
+    )
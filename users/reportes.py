@@ -0,0 +1,106 @@
+"""Resumen diario de ventas por destino (VentasResumenDiario).
+
+`registrar_venta` se llama dentro de la transacción de la compra; `reconstruir`
+recalcula un rango de días desde Ventas, por si el resumen se desfasa (por
+ejemplo al borrar ventas) o para cargarlo por primera vez.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Ventas, VentasResumenDiario
+
+
+def registrar_venta(venta, num_boletos, num_paquetes):
+    """Suma `venta` a la fila de su día y destino."""
+    dia = timezone.localdate(venta.fecha_compra)
+    mixta = 1 if num_boletos and num_paquetes else 0
+    incrementos = {
+        'ventas': F('ventas') + 1,
+        'boletos': F('boletos') + num_boletos,
+        'paquetes': F('paquetes') + num_paquetes,
+        'mixtas': F('mixtas') + mixta,
+        'ingresos': F('ingresos') + venta.total_pagado,
+    }
+    fila = VentasResumenDiario.objects.filter(dia=dia, destino_id=venta.destino_id)
+
+    if fila.update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            VentasResumenDiario.objects.create(
+                dia=dia,
+                destino_id=venta.destino_id,
+                ventas=1,
+                boletos=num_boletos,
+                paquetes=num_paquetes,
+                mixtas=mixta,
+                ingresos=venta.total_pagado,
+            )
+    except IntegrityError:
+        # Otra compra creó la fila entre el UPDATE y el INSERT
+        fila.update(**incrementos)
+
+
+@transaction.atomic
+def reconstruir(desde, hasta, batch_size=1000):
+    """Recalcula el resumen de los días entre `desde` y `hasta` (inclusive)."""
+    VentasResumenDiario.objects.filter(dia__range=(desde, hasta)).delete()
+
+    filas = (
+        Ventas.objects.filter(fecha_compra__date__range=(desde, hasta))
+        .con_conteos()
+        .annotate(dia=TruncDate('fecha_compra'))
+        .order_by()
+        .values('dia', 'destino_id')
+        .annotate(
+            n_ventas=Count('id'),
+            n_boletos=Coalesce(Sum('num_boletos'), 0),
+            n_paquetes=Coalesce(Sum('num_paquetes'), 0),
+            n_mixtas=Count('id', filter=Q(num_boletos__gt=0, num_paquetes__gt=0)),
+            n_ingresos=Coalesce(Sum('total_pagado'), Decimal('0')),
+        )
+    )
+    resumen = [
+        VentasResumenDiario(
+            dia=fila['dia'],
+            destino_id=fila['destino_id'],
+            ventas=fila['n_ventas'],
+            boletos=fila['n_boletos'],
+            paquetes=fila['n_paquetes'],
+            mixtas=fila['n_mixtas'],
+            ingresos=fila['n_ingresos'],
+        )
+        for fila in filas
+    ]
+    VentasResumenDiario.objects.bulk_create(resumen, batch_size=batch_size)
+    return len(resumen)
+
+
+def kpis(desde=None):
+    """Totales del resumen, opcionalmente a partir de un día."""
+    resumen = VentasResumenDiario.objects.all()
+    if desde:
+        resumen = resumen.filter(dia__gte=desde)
+    return resumen.aggregate(
+        ventas=Coalesce(Sum('ventas'), 0),
+        boletos=Coalesce(Sum('boletos'), 0),
+        paquetes=Coalesce(Sum('paquetes'), 0),
+        mixtas=Coalesce(Sum('mixtas'), 0),
+        ingresos=Coalesce(Sum('ingresos'), Decimal('0')),
+    )
+
+
+def kpis_recientes(desde=None):
+    """Como `kpis`, pero guardados en caché hasta KPIS_CACHE_SEGUNDOS (para el panel)."""
+    clave = f'reportes:kpis:{desde or "total"}'
+    totales = cache.get(clave)
+    if totales is None:
+        totales = kpis(desde)
+        cache.set(clave, totales, settings.KPIS_CACHE_SEGUNDOS)
+    return totales
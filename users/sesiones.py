@@ -0,0 +1,67 @@
+"""Sesiones en caché con escritura a la base de datos solo cuando cambian.
+
+SESSION_ENGINE apunta a este módulo. Las sesiones se leen del caché 'sesiones'
+(CACHES) y, si no están, de django_session; al guardarse se escriben en las dos
+(cached_db de Django). Además, si la vista asignó valores iguales a los que ya
+tenía la sesión (ver_carrito guarda el total en cada visita), no se hace el
+UPDATE: se comparan los datos serializados con los que se cargaron.
+
+`limpiar` (comando limpiar_sesiones) borra las sesiones vencidas por lotes
+cortos, cada uno en su propia transacción, para no bloquear la tabla.
+"""
+import time
+
+from django.contrib.sessions.backends import cached_db
+from django.utils import timezone
+
+
+class SessionStore(cached_db.SessionStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Datos serializados tal como se cargaron; None si aún no se leyeron
+        self._cargado = None
+
+    def _firma(self, datos):
+        return self.serializer().dumps(datos)
+
+    def load(self):
+        datos = super().load()
+        self._cargado = self._firma(datos) if datos else None
+        return datos
+
+    def clear(self):
+        # flush() (logout) pasa por aquí: lo cargado antes ya no dice nada de la sesión nueva
+        super().clear()
+        self._cargado = None
+
+    def save(self, must_create=False):
+        # Sin session_key hay que crear la fila y la cookie aunque los datos coincidan
+        if (
+            not must_create and self.session_key and self._cargado is not None
+            and self._firma(self._get_session()) == self._cargado
+        ):
+            return
+        super().save(must_create)
+        self._cargado = self._firma(self._session)
+
+
+def limpiar(lote=1000, pausa=0.1):
+    """Borra las sesiones vencidas de `lote` en `lote`, pausando `pausa` segundos entre lotes.
+
+    Devuelve cuántas se borraron.
+    """
+    from django.contrib.sessions.models import Session
+
+    ahora = timezone.now()
+    borradas = 0
+    while True:
+        claves = list(
+            Session.objects.filter(expire_date__lt=ahora).values_list('session_key', flat=True)[:lote]
+        )
+        if not claves:
+            return borradas
+        borradas += Session.objects.filter(session_key__in=claves, expire_date__lt=ahora).delete()[0]
+        if len(claves) < lote:
+            return borradas
+        time.sleep(pausa)
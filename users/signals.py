@@ -1,35 +1,83 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Horario, Boleto, Paquete
-import random
+from .models import Horario, Boleto, Paquete, Usuario, Destino, Ventas, CosteEnvio
+from . import autenticacion, busqueda, catalogo, imagenes, inventario, unicidad
+from .eventos import registrar
 
 @receiver(post_save, sender=Horario)
 def crear_boletos_automaticamente(sender, instance, created, **kwargs):
     if not created:
         return
         
-    destino = instance.destino
     horario = instance
 
+    if horario.boletos_perezosos:
+        # Los boletos se crean al reservarse; aquí solo se registra la capacidad
+        inventario.crear_boletos([horario])
+        registrar('horario.creado', horario=horario.pk, boletos_perezosos=True)
+        return
+
     if not Boleto.objects.filter(horario=horario).exists():
-        boletos = []
-        for i in range(100):  
-
-            tipo = random.choices(['general', 'vip'], weights=[70, 30])[0]
-            precio = destino.precio_vip if tipo == 'vip' else destino.precio_general
-            
-            boletos.append(Boleto(
-                tipo=tipo,
-                precio=precio,
-                destino=destino,
-                horario=horario,
-                estado='libre'
-            ))
-        
-        Boleto.objects.bulk_create(boletos)
-        print(f"✅ {len(boletos)} boletos creados para {destino.nombre} - {horario.fecha} {horario.hora}")
+        creados = inventario.crear_boletos([horario])
+        registrar('horario.creado', horario=horario.pk, boletos_perezosos=False, boletos=creados)
 
 @receiver(post_save, sender=Paquete)
 def log_paquete_creation(sender, instance, created, **kwargs):
     if created:
-        print(f"📦 Paquete creado: ID {instance.id} - {instance.tipo} para {instance.receptor}")
\ No newline at end of file
+        registrar('paquete.creado', paquete=instance.pk, tipo=instance.tipo,
+                  destino=instance.destino_id, remitente=instance.remitente_id,
+                  precio_envio=instance.precio_envio)
+
+# Campos que forman parte del documento de búsqueda de las ventas (users.busqueda)
+CAMPOS_BUSQUEDA = {
+    Usuario: ('nombre', 'cedula'),
+    Destino: ('nombre',),
+}
+
+
+@receiver(pre_save, sender=Usuario)
+@receiver(pre_save, sender=Destino)
+def detectar_cambio_busqueda(sender, instance, update_fields=None, **kwargs):
+    campos = CAMPOS_BUSQUEDA[sender]
+    instance._reindexar_ventas = False
+    if instance.pk is None or (update_fields is not None and not set(campos) & set(update_fields)):
+        return
+    anteriores = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+    instance._reindexar_ventas = anteriores is not None and anteriores != tuple(
+        getattr(instance, campo) for campo in campos
+    )
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=Destino)
+def reindexar_ventas(sender, instance, created, **kwargs):
+    if created or not getattr(instance, '_reindexar_ventas', False):
+        return
+    relacion = 'usuario' if sender is Usuario else 'destino'
+    busqueda.reindexar(Ventas.objects.filter(**{relacion: instance}))
+
+
+@receiver(post_save, sender=Usuario)
+def olvidar_valores_libres(sender, instance, **kwargs):
+    unicidad.olvidar(instance)
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def olvidar_usuario_en_cache(sender, instance, **kwargs):
+    autenticacion.olvidar(instance.pk)
+
+
+@receiver(post_save, sender=Destino)
+def generar_variantes_imagen(sender, instance, **kwargs):
+    imagenes.programar(instance)
+
+
+@receiver(post_save, sender=Destino)
+@receiver(post_delete, sender=Destino)
+@receiver(post_save, sender=Horario)
+@receiver(post_delete, sender=Horario)
+@receiver(post_save, sender=CosteEnvio)
+@receiver(post_delete, sender=CosteEnvio)
+def invalidar_catalogo(sender, **kwargs):
+    catalogo.invalidar_al_confirmar()
@@ -0,0 +1,41 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const input = document.querySelector('input[data-autocompletar]');
+    if (!input) {
+        return;
+    }
+    const lista = document.getElementById(input.getAttribute('list'));
+    const rol = input.form ? input.form.querySelector('select[name="rol"]') : null;
+    let espera = null;
+    let pedido = null;
+
+    input.addEventListener('input', function () {
+        clearTimeout(espera);
+        const texto = input.value.trim();
+        if (texto.length < 2) {
+            lista.innerHTML = '';
+            return;
+        }
+        espera = setTimeout(function () {
+            if (pedido) {
+                pedido.abort();
+            }
+            pedido = new AbortController();
+            const params = new URLSearchParams({ q: texto });
+            if (rol && rol.value) {
+                params.set('rol', rol.value);
+            }
+            fetch(`${input.dataset.autocompletar}?${params}`, { signal: pedido.signal })
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    lista.innerHTML = '';
+                    (datos.resultados || []).forEach(function (usuario) {
+                        const opcion = document.createElement('option');
+                        opcion.value = usuario.cedula;
+                        opcion.label = `${usuario.nombre} - ${usuario.email} (${usuario.rol})`;
+                        lista.appendChild(opcion);
+                    });
+                })
+                .catch(function () {});
+        }, 200);
+    });
+});
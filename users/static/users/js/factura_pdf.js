@@ -0,0 +1,48 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const boton = document.querySelector('a[data-factura-pdf]');
+    if (!boton) {
+        return;
+    }
+    const textoOriginal = boton.textContent;
+
+    function esperar(estadoUrl) {
+        fetch(estadoUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(function (respuesta) { return respuesta.json(); })
+            .then(function (datos) {
+                if (datos.estado === 'lista') {
+                    boton.textContent = textoOriginal;
+                    window.location = datos.descarga_url;
+                } else if (datos.estado === 'pendiente') {
+                    setTimeout(function () { esperar(estadoUrl); }, 1000);
+                } else if (datos.estado === 'error') {
+                    // No se reintenta: el servidor no lo permite hasta pasado un tiempo
+                    boton.textContent = 'No se pudo generar el PDF';
+                } else {
+                    // Trabajo perdido: se vuelve a pedir la factura
+                    boton.textContent = textoOriginal;
+                    window.location = boton.href;
+                }
+            });
+    }
+
+    boton.addEventListener('click', function (e) {
+        e.preventDefault();
+        boton.textContent = 'Generando PDF...';
+        fetch(boton.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(function (respuesta) {
+                if (respuesta.status === 202) {
+                    return respuesta.json().then(function (datos) { esperar(datos.estado_url); });
+                }
+                if (respuesta.status === 500) {
+                    boton.textContent = 'No se pudo generar el PDF';
+                    return;
+                }
+                boton.textContent = textoOriginal;
+                window.location = boton.href;
+            })
+            .catch(function () {
+                boton.textContent = textoOriginal;
+                window.location = boton.href;
+            });
+    });
+});
@@ -95,7 +95,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     Swal.fire({
                         icon: 'error',
                         title: '¡Error!',
-                        text: 'El usuario con esa cédula, teléfono o email ya está registrado.'
+                        text: (data.mensajes && data.mensajes.length)
+                            ? data.mensajes.join('\n')
+                            : 'El usuario con esa cédula, teléfono o email ya está registrado.'
                     });
                 } else {
                     // Si no existen los datos, se puede enviar el formulario
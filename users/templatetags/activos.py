@@ -0,0 +1,32 @@
+import json
+import os
+
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+
+from users.activos import MANIFIESTO
+
+register = template.Library()
+
+_manifiesto = (None, {})
+
+
+def _leer_manifiesto():
+    """Manifiesto de users.activos; se relee si cambia (p. ej. tras construir_activos)."""
+    global _manifiesto
+    try:
+        fecha = os.stat(MANIFIESTO).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _manifiesto[0] != fecha:
+        _manifiesto = (fecha, json.loads(MANIFIESTO.read_text(encoding='utf-8')))
+    return _manifiesto[1]
+
+
+@register.simple_tag
+def activo(ruta):
+    """URL de la versión reducida de la hoja `ruta`, o de la original si no se generó."""
+    if settings.ACTIVOS_REDUCIDOS:
+        ruta = _leer_manifiesto().get(ruta, ruta)
+    return static(ruta)
@@ -1,3 +1,270 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import busqueda, inventario, paginacion, reportes
+from .models import Boleto, CarritoBoletos, Destino, Horario, InventarioHorario, Usuario, Ventas
+
+
+def crear_cliente(n=0):
+    return Usuario.objects.create_user(
+        email=f'cliente{n}@gmail.com', password='clave-segura-1', nombre='Ana Pérez',
+        cedula=f'1234567{n}', telefono=f'0412000000{n}', rol='cliente',
+    )
+
+
+def crear_horario(perezosos=False):
+    destino = Destino.objects.create(nombre='París', precio_general=100, precio_vip=200)
+    return Horario.objects.create(
+        destino=destino, fecha=datetime.date(2030, 1, 1), hora=datetime.time(8, 0),
+        capacidad_general=5, capacidad_vip=2, boletos_perezosos=perezosos,
+    )
+
+
+def crear_carrito(usuario, horario):
+    return CarritoBoletos.objects.create(usuario=usuario, destino=horario.destino, horario=horario, cantidad=0)
+
+
+class ReclamarTests(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+
+    def inventario(self, horario):
+        return {
+            fila.tipo: (fila.libre, fila.carrito, fila.por_emitir)
+            for fila in InventarioHorario.objects.filter(horario=horario)
+        }
+
+    def test_sin_boletos_suficientes_no_reclama_ninguno(self):
+        horario = crear_horario()
+        carrito = crear_carrito(self.cliente, horario)
+
+        with self.assertRaises(inventario.BoletosInsuficientes) as error:
+            inventario.reclamar(carrito, 8)
+
+        self.assertEqual(error.exception.disponibles, 7)
+        self.assertFalse(Boleto.objects.filter(estado='carrito').exists())
+        self.assertEqual(self.inventario(horario), {'general': (5, 0, 0), 'vip': (2, 0, 0)})
+        carrito.refresh_from_db()
+        self.assertEqual(carrito.cantidad, 0)
+
+    def test_reclamar_un_tipo(self):
+        horario = crear_horario()
+        carrito = crear_carrito(self.cliente, horario)
+
+        ids = inventario.reclamar(carrito, 2, 'vip')
+
+        self.assertEqual(set(Boleto.objects.filter(id__in=ids).values_list('tipo', 'estado')), {('vip', 'carrito')})
+        self.assertEqual(self.inventario(horario), {'general': (5, 0, 0), 'vip': (0, 2, 0)})
+        self.assertEqual((carrito.cantidad, carrito.total), (2, 400))
+        with self.assertRaises(inventario.BoletosInsuficientes):
+            inventario.reclamar(carrito, 1, 'vip')
+
+    def test_reclamar_sin_tipo(self):
+        horario = crear_horario()
+        carrito = crear_carrito(self.cliente, horario)
+
+        ids = inventario.reclamar(carrito, 6)
+
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(sorted(carrito.boletos.values_list('id', flat=True)), sorted(ids))
+        filas = self.inventario(horario)
+        en_carrito = Boleto.objects.filter(estado='carrito')
+        for tipo in ('general', 'vip'):
+            self.assertEqual(filas[tipo][1], en_carrito.filter(tipo=tipo).count())
+            self.assertEqual(sum(filas[tipo][:2]), horario.capacidad(tipo))
+        self.assertEqual(carrito.total, sum(en_carrito.values_list('precio', flat=True)))
+
+    def test_horario_perezoso_emite_los_boletos(self):
+        horario = crear_horario(perezosos=True)
+        carrito = crear_carrito(self.cliente, horario)
+        self.assertFalse(Boleto.objects.filter(horario=horario).exists())
+
+        ids = inventario.reclamar(carrito, 3, 'general')
+
+        self.assertEqual(Boleto.objects.filter(id__in=ids, estado='carrito', tipo='general').count(), 3)
+        self.assertEqual(self.inventario(horario), {'general': (2, 3, 2), 'vip': (2, 0, 2)})
+        self.assertEqual(carrito.total, 300)
+
+        with self.assertRaises(inventario.BoletosInsuficientes):
+            inventario.reclamar(carrito, 3, 'vip')
+        self.assertEqual(Boleto.objects.filter(horario=horario).count(), 3)
+        self.assertEqual(self.inventario(horario)['vip'], (2, 0, 2))
+
+    def test_reintenta_si_otro_comprador_se_adelanta(self):
+        horario = crear_horario()
+        carrito = crear_carrito(self.cliente, horario)
+        original = inventario._reclamar
+        llamadas = []
+
+        def interrumpir_una_vez(*args):
+            llamadas.append(args)
+            if len(llamadas) == 1:
+                raise inventario._ReclamoInterrumpido()
+            return original(*args)
+
+        with mock.patch.object(inventario, '_reclamar', side_effect=interrumpir_una_vez):
+            ids = inventario.reclamar(carrito, 2)
+
+        self.assertEqual(len(llamadas), 2)
+        self.assertEqual(len(ids), 2)
+
+    def test_reintentos_agotados(self):
+        horario = crear_horario()
+        carrito = crear_carrito(self.cliente, horario)
+
+        with mock.patch.object(inventario, '_reclamar', side_effect=inventario._ReclamoInterrumpido) as reclamo:
+            with self.assertRaises(inventario.BoletosInsuficientes):
+                inventario.reclamar(carrito, 2)
+
+        self.assertEqual(reclamo.call_count, inventario.REINTENTOS_RECLAMO)
+        self.assertFalse(Boleto.objects.filter(estado='carrito').exists())
+
+
+class PaginacionTests(TestCase):
+    CAMPOS = ['-fecha_compra', '-id']
+
+    def setUp(self):
+        cliente = crear_cliente()
+        destino = Destino.objects.create(nombre='Roma', precio_general=10, precio_vip=20)
+        Ventas.objects.bulk_create([
+            Ventas(usuario=cliente, destino=destino, cantidad=1, total_pagado=10) for _ in range(23)
+        ])
+        # Solo tres fechas distintas: casi todas las filas empatan en la primera clave
+        fechas = [timezone.now() - datetime.timedelta(days=d) for d in range(3)]
+        for i, venta_id in enumerate(Ventas.objects.order_by('id').values_list('id', flat=True)):
+            Ventas.objects.filter(id=venta_id).update(fecha_compra=fechas[i % 3])
+        self.esperado = list(Ventas.objects.order_by(*self.CAMPOS).values_list('id', flat=True))
+
+    def paginar(self, cursor=None):
+        return paginacion.paginar(Ventas.objects.all(), self.CAMPOS, cursor, 5)
+
+    def ids(self, pagina):
+        return [venta.id for venta in pagina]
+
+    def test_adelante_y_atras_sin_repetidos_ni_huecos(self):
+        paginas = [self.paginar()]
+        while paginas[-1].has_next():
+            paginas.append(self.paginar(paginas[-1].cursor_siguiente))
+        self.assertEqual([len(p) for p in paginas], [5, 5, 5, 5, 3])
+        self.assertEqual(sum((self.ids(p) for p in paginas), []), self.esperado)
+        self.assertFalse(paginas[0].has_previous())
+
+        pagina = paginas[-1]
+        hacia_atras = [self.ids(pagina)]
+        while pagina.has_previous():
+            pagina = self.paginar(pagina.cursor_anterior)
+            hacia_atras.append(self.ids(pagina))
+        self.assertEqual(hacia_atras, [self.ids(p) for p in reversed(paginas)])
+
+    def test_cursor_mal_formado_vuelve_a_la_primera_pagina(self):
+        def cursor(datos):
+            return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+        primera = self.ids(self.paginar())
+        for malo in [
+            'esto-no-es-base64!',
+            cursor(['sig']),
+            cursor({'d': 'sig'}),
+            cursor({'d': 'lado', 'v': ['2030-01-01T00:00:00', 1]}),
+            cursor({'d': 'sig', 'v': [1]}),
+            cursor({'d': 'sig', 'v': ['no es fecha', 1]}),
+        ]:
+            with self.subTest(cursor=malo):
+                pagina = self.paginar(malo)
+                self.assertEqual(self.ids(pagina), primera)
+                self.assertFalse(pagina.has_previous())
+
+
+class SesionesTests(TestCase):
+
+    def test_mismos_datos_tras_cerrar_sesion(self):
+        from django.contrib.sessions.models import Session
+        from .sesiones import SessionStore
+
+        inicial = SessionStore()
+        inicial['usuario'] = 1
+        inicial.save()
+
+        sesion = SessionStore(inicial.session_key)
+        self.assertEqual(sesion['usuario'], 1)
+        sesion.flush()
+        sesion['usuario'] = 1
+        sesion.save()
+
+        self.assertIsNotNone(sesion.session_key)
+        self.assertNotEqual(sesion.session_key, inicial.session_key)
+        self.assertEqual(Session.objects.get(pk=sesion.session_key).get_decoded(), {'usuario': 1})
+
+    def test_sin_cambios_no_escribe(self):
+        from .sesiones import SessionStore
+
+        inicial = SessionStore()
+        inicial['total_carrito'] = 10.0
+        inicial.save()
+
+        sesion = SessionStore(inicial.session_key)
+        sesion['total_carrito'] = 10.0
+        with self.assertNumQueries(0):
+            sesion.save()
+
+
+class ConfirmarCompraTests(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+        self.horario = crear_horario()
+        inventario.reclamar(crear_carrito(self.cliente, self.horario), 3)
+        self.client.force_login(self.cliente)
+
+    def test_venta_indexada_para_la_busqueda(self):
+        respuesta = self.client.get('/confirmar/')
+        venta = Ventas.objects.get()
+        self.assertRedirects(respuesta, f'/factura/{venta.pk}/', fetch_redirect_response=False)
+        self.assertEqual(venta.boletos.count(), 3)
+        self.assertEqual(list(busqueda.filtrar(Ventas.objects.all(), 'paris')), [venta])
+
+    def test_venta_sumada_al_resumen_diario(self):
+        self.client.get('/confirmar/')
+        totales = reportes.kpis()
+        self.assertEqual(totales['ventas'], 1)
+        self.assertEqual(totales['boletos'], 3)
+        self.assertEqual(totales['ingresos'], Ventas.objects.get().total_pagado)
+
+
+class ServirMedioTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, MEDIOS_ENVIO='')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.comprobante = 'comprobantes/ab/cd/' + 'abcd' * 16 + '.jpg'
+        for nombre in (self.comprobante, 'destinos/paris.jpg'):
+            ruta = f'{self.media}/{nombre}'
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, 'wb') as archivo:
+                archivo.write(b'imagen')
+
+    def test_comprobante_privado(self):
+        self.assertEqual(self.client.get(f'/media/{self.comprobante}').status_code, 404)
+
+    def test_comprobante_con_punto(self):
+        self.assertEqual(self.client.get(f'/media/./{self.comprobante}').status_code, 404)
+
+    def test_comprobante_con_dos_puntos(self):
+        self.assertEqual(self.client.get(f'/media/destinos/../{self.comprobante}').status_code, 404)
+
+    def test_imagen_publica(self):
+        respuesta = self.client.get('/media/destinos/paris.jpg')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), b'imagen')
@@ -0,0 +1,90 @@
+"""Unicidad de cédula, teléfono y correo de los usuarios.
+
+`ocupados` responde por los tres campos con una sola consulta. Para absorber las
+verificaciones repetidas que hace la página de registro, cada proceso recuerda
+por UNICIDAD_CACHE_SEGUNDOS los valores que encontró libres. Ese caché puede
+quedar desfasado entre procesos, así que solo sirve para avisar antes: al
+registrar, quien decide es la restricción única de la base de datos.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Usuario
+
+CAMPOS = ('cedula', 'telefono', 'email')
+
+MENSAJES = {
+    'cedula': "Ya existe un usuario con esta cédula.",
+    'telefono': "Ya existe un usuario con este número de teléfono.",
+    'email': "Ya existe un usuario con este correo electrónico.",
+}
+
+_libres = OrderedDict()
+_candado = threading.Lock()
+
+
+def _libre_en_cache(campo, valor, ahora):
+    with _candado:
+        vence = _libres.get((campo, valor))
+        if vence is None:
+            return False
+        if vence < ahora:
+            del _libres[(campo, valor)]
+            return False
+        return True
+
+
+def _recordar_libres(pares, ahora):
+    vence = ahora + settings.UNICIDAD_CACHE_SEGUNDOS
+    with _candado:
+        for par in pares:
+            _libres[par] = vence
+            _libres.move_to_end(par)
+        while len(_libres) > settings.UNICIDAD_CACHE_MAX:
+            _libres.popitem(last=False)
+
+
+def olvidar(usuario):
+    """Quita del caché los valores de `usuario`, que ya no están libres."""
+    with _candado:
+        for campo in CAMPOS:
+            _libres.pop((campo, getattr(usuario, campo)), None)
+
+
+def ocupados(cedula=None, telefono=None, email=None, usar_cache=False, excluir=None):
+    """Conjunto de campos cuyo valor ya usa otro usuario, en una consulta.
+
+    Los valores vacíos no se comprueban. Con `usar_cache` no se consultan los
+    valores que este proceso vio libres hace poco.
+    """
+    valores = {'cedula': cedula, 'telefono': telefono, 'email': email}
+    ahora = time.monotonic()
+    pendientes = {
+        campo: valor for campo, valor in valores.items()
+        if valor and not (usar_cache and _libre_en_cache(campo, valor, ahora))
+    }
+    if not pendientes:
+        return set()
+
+    condicion = Q()
+    for campo, valor in pendientes.items():
+        condicion |= Q(**{campo: valor})
+    usuarios = Usuario.objects.filter(condicion)
+    if excluir is not None:
+        usuarios = usuarios.exclude(pk=excluir)
+    conteos = usuarios.aggregate(**{
+        campo: Count('pk', filter=Q(**{campo: valor}))
+        for campo, valor in pendientes.items()
+    })
+
+    resultado = {campo for campo, n in conteos.items() if n}
+    if usar_cache:
+        _recordar_libres(
+            [(campo, valor) for campo, valor in pendientes.items() if campo not in resultado],
+            ahora,
+        )
+    return resultado
@@ -1,6 +1,5 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
-from django.conf.urls.static import static
 from django.conf import settings
 
 urlpatterns = [
@@ -14,6 +13,7 @@ urlpatterns = [
     path('edit/<int:user_id>/', views.edit_user, name='edit_user'),
     path('usuarios/eliminar/<int:user_id>/', views.delete_user, name='delete_user'),
     path('listar_users/', views.list_users, name='list_users'),
+    path('listar_users/autocompletar/', views.autocompletar_usuarios, name='autocompletar_usuarios'),
     path('logout/', views.logout, name='logout'),
     path('register_employer/', views.registrar_aspirante, name='register_aspirante'),
     path('boletos/', views.listar_boletos, name='listar_boletos'),
@@ -32,9 +32,11 @@ urlpatterns = [
     path('destino/<int:destino_id>/seleccionar/', views.seleccionar_boletos, name='seleccionar_boletos'),
     path('crear_horario/', views.crear_horario, name='crear_horario'),
     path('horarios/', views.listar_horarios, name='listar_horarios'),
+    path('horarios/generar/', views.generar_horarios, name='generar_horarios'),
     path('admi/gestionar-pagos/', views.gestionar_pagos, name='gestionar_pagos'),
     path('pago/', views.realizar_pago, name='realizar_pago'),
     path('historial-ventas/', views.historial_ventas, name='historial_ventas'),
+    path('historial-ventas/exportar-facturas/', views.exportar_facturas, name='exportar_facturas'),
     path('factura/<int:venta_id>/', views.factura, name='factura'),
     path('gestionar_aspirantes/', views.gestionar_aspirantes, name='gestionar_aspirantes'),
     path('enviar_paq/', views.enviar_paquete, name='enviar_paquete'),
@@ -45,6 +47,8 @@ urlpatterns = [
     path('carrito/eliminar/<int:carrito_id>/', views.eliminar_boleto_carrito, name='eliminar_boleto'),
     path('carrito/vaciar/', views.vaciar_carrito, name='vaciar_carrito'),
     path('factura_pdf/<int:venta_id>/', views.factura_pdf, name='factura_pdf'),
+    path('factura_pdf/<int:venta_id>/<slug:huella>/estado/', views.factura_pdf_estado, name='factura_pdf_estado'),
+    path('factura_pdf/<int:venta_id>/<slug:huella>/', views.factura_pdf_descargar, name='factura_pdf_descargar'),
     path('eliminar-paquete/<int:pk>/', views.eliminar_paquete_carrito, name='eliminar_paquete'),
     path('mis_paquetes/', views.mis_paquetes, name='mis_paquetes'),
     path('403/', views.error_403, name='error_403'),
@@ -52,5 +56,7 @@ urlpatterns = [
 ]
 
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Con o sin DEBUG: la vista comprueba permisos y delega el envío al proxy (users.medios)
+urlpatterns += [
+    re_path(r'^%s(?P<nombre>.+)$' % settings.MEDIA_URL.lstrip('/'), views.servir_medio, name='servir_medio'),
+]
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .forms import UsuarioLoginForm, UsuarioRegistroForm, UsuarioEdicionForm, RegisterAspiranteForm, DestinoForm, PagoForm,HorarioForm,PaqueteForm
+from .forms import UsuarioLoginForm, UsuarioRegistroForm, UsuarioEdicionForm, RegisterAspiranteForm, DestinoForm, PagoForm,HorarioForm,PaqueteForm, HorarioRecurrenteForm
 from .models import Usuario, Boleto, CarritoPaquetes,CarritoBoletos, Destino, Pago, Ventas, Reserva, Horario, Paquete
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
@@ -8,11 +8,10 @@ from django.utils import timezone
 from django.http import HttpResponseForbidden
 from django.utils.timezone import now
 from django.http import HttpResponseRedirect
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_http_methods
 from django.http import Http404
 import datetime
 from django.contrib.admin.views.decorators import staff_member_required
-from decimal import Decimal
 from django.db.models import Sum, F, ExpressionWrapper, DecimalField
 from django.urls import reverse
 from django.contrib.admin.views.decorators import staff_member_required
@@ -22,26 +21,22 @@ import json
 from django.db.models import Q
 from django.db.models import Count
 from django.template.loader import render_to_string
-from django.http import HttpResponse
-from weasyprint import HTML
-import tempfile
-import random
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django.db.models import Prefetch
 from collections import Counter
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils.safestring import mark_safe
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from . import busqueda, catalogo, facturas, inventario, medios, paginacion, reportes, unicidad, horarios as generador_horarios
+from .compras import procesar_compra, totales_carrito
+from .eventos import registrar
 
 
 def index(request):
 
-    destinos = Destino.objects.all()
-    
-
-    destinos_aleatorios = random.sample(list(destinos), 3) if len(destinos) >= 3 else destinos
-
     context = {
-        'destinos': destinos_aleatorios
+        'destacados': catalogo.destacados(3),
     }
 
     return render(request, 'users/index.html', context)
@@ -69,6 +64,8 @@ def home_admin(request):
     usuario_actual = request.user
     return render(request, 'users/home_admin.html', {
         'usuario_actual': usuario_actual,
+        'kpis_total': reportes.kpis_recientes(),
+        'kpis_hoy': reportes.kpis_recientes(desde=timezone.localdate()),
     })
 
 
@@ -127,8 +124,7 @@ def login(request):
 def register(request):
     if request.method == 'POST':
         form = UsuarioRegistroForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save():
             messages.success(request, "Usuario registrado con éxito.")
             return redirect('login')
         else:
@@ -148,8 +144,7 @@ def register(request):
 def registrar_aspirante(request):
     if request.method == 'POST':
         form = RegisterAspiranteForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save():
             return redirect('login')  
     else:
         form = RegisterAspiranteForm()
@@ -202,23 +197,12 @@ def list_users(request):
     usuarios = Usuario.objects.exclude(id=usuario_actual.id)
 
     if query:
-        usuarios = usuarios.filter(
-            Q(nombre__icontains=query) |
-            Q(email__icontains=query) |
-            Q(cedula__icontains=query) |
-            Q(rol__icontains=query)
-        )
+        usuarios = busqueda.filtrar_usuarios(usuarios, query)
 
     if rol:
         usuarios = usuarios.filter(rol=rol)
 
-    usuarios = usuarios.order_by('id')
-
-
-    from django.core.paginator import Paginator
-    paginator = Paginator(usuarios, 10)  
-    page_number = request.GET.get('page')
-    usuarios_paginados = paginator.get_page(page_number)
+    usuarios_paginados = paginacion.paginar(usuarios, ['id'], request.GET.get('cursor'), 10)
 
     return render(request, 'users/list_users.html', {
         'usuarios': usuarios_paginados,
@@ -228,6 +212,21 @@ def list_users(request):
     })
 
 
+@login_required
+def autocompletar_usuarios(request):
+    if request.user.rol != 'admin':
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+
+    usuarios = Usuario.objects.exclude(id=request.user.id)
+    rol = request.GET.get('rol', '')
+    if rol:
+        usuarios = usuarios.filter(rol=rol)
+
+    return JsonResponse({
+        'resultados': busqueda.autocompletar_usuarios(usuarios, request.GET.get('q', '')),
+    })
+
+
 def logout(request):
     auth_logout(request)  
     messages.success(request, "Sesión cerrada correctamente.")
@@ -250,10 +249,12 @@ def listar_destinos(request):
     if rol_usuario not in ['admin', 'empleado']:
         return render(request, 'users/error_403.html', status=403)  
 
-    destinos = Destino.objects.all()
+    # Sin evaluar: si la tabla está en caché (users.catalogo) no se consulta
+    destinos = Destino.objects.con_disponibilidad()
     return render(request, 'users/list_destinos.html', {
         'destinos': destinos,
         'rol': rol_usuario,
+        **catalogo.contexto(),
     })
 
 
@@ -292,7 +293,7 @@ def crear_destino(request):
 def editar_destino(request, pk):
     destino = get_object_or_404(Destino, pk=pk)
     if request.method == 'POST':
-        form = DestinoForm(request.POST, instance=destino)
+        form = DestinoForm(request.POST, request.FILES, instance=destino)
         if form.is_valid():
             form.save()
             return redirect('list_destinos')
@@ -318,10 +319,12 @@ def destiny_client(request):
     if request.user.rol != 'cliente':
         return render(request, '403.html', status=403)
 
-    destinos = Destino.objects.all() 
+    # Sin evaluar: si el listado está en caché (users.catalogo) no se consulta
+    destinos = Destino.objects.con_disponibilidad()
 
     context = {
-        'destinos': destinos
+        'destinos': destinos,
+        **catalogo.contexto(),
     }
 
     return render(request, 'users/destiny.html', context)
@@ -347,33 +350,28 @@ def seleccionar_boletos(request, destino_id):
         horario_id = request.POST.get("horario_id")
         horario = get_object_or_404(Horario, id=horario_id)
 
-        boletos_disponibles = Boleto.objects.filter(destino=destino, horario=horario, estado='libre')[:cantidad]
-
-        if boletos_disponibles.count() < cantidad:
+        if inventario.disponibles(horario) < cantidad:
             return render(request, "detalle_destino.html", {
                 "destino": destino,
                 "horarios": destino.horarios.all(),
                 "error": "No hay suficientes boletos disponibles para este horario."
             })
 
-
-        carrito = CarritoBoletos.objects.create(
-            usuario=request.user,
-            destino=destino,
-            cantidad=cantidad,
-            horario=horario,
-            total=sum(b.precio for b in boletos_disponibles)
-        )
-
-
-        for boleto in boletos_disponibles:
-            boleto.estado = "carrito"
-            boleto.save()
-            carrito.boletos.add(boleto)
-
-
-        destino.boletos_disponibles = Boleto.objects.filter(destino=destino, estado='libre').count()
-        destino.save()
+        try:
+            with transaction.atomic():
+                carrito = CarritoBoletos.objects.create(
+                    usuario=request.user,
+                    destino=destino,
+                    cantidad=0,
+                    horario=horario,
+                )
+                inventario.reclamar(carrito, cantidad)
+        except inventario.BoletosInsuficientes:
+            return render(request, "detalle_destino.html", {
+                "destino": destino,
+                "horarios": destino.horarios.all(),
+                "error": "No hay suficientes boletos disponibles para este horario."
+            })
 
         return redirect("ver_carrito")
 
@@ -385,15 +383,12 @@ def realizar_pago(request):
     carritos_boletos = CarritoBoletos.objects.filter(usuario=request.user)
     carritos_paquetes = CarritoPaquetes.objects.filter(usuario=request.user)
 
-    if not carritos_boletos.exists() and not carritos_paquetes.exists():
+    totales = totales_carrito(request.user)
+    if not totales['num_boletos'] and not totales['num_paquetes']:
         messages.warning(request, 'Tu carrito está vacío.')
         return redirect('ver_carrito')
 
-    total = Decimal('0')
-    for carrito in carritos_boletos:
-        total += carrito.calcular_total()
-    for carrito in carritos_paquetes:
-        total += carrito.calcular_total()
+    total = totales['total']
 
     if request.method == 'POST':
         form = PagoForm(request.POST, request.FILES)
@@ -404,9 +399,10 @@ def realizar_pago(request):
                 pago.monto = total
                 pago.estado = 'pendiente'
                 pago.save()
+                registrar('pago.registrado', pago=pago.pk, usuario=request.user.pk, monto=pago.monto)
 
 
-                venta = procesar_compra(request.user)
+                venta = procesar_compra(request.user, base_url=request.build_absolute_uri('/'))
                 
                 messages.success(request, 'Pago realizado con éxito. Se ha generado tu factura.')
                 return redirect('factura', venta_id=venta.id)
@@ -430,7 +426,7 @@ def realizar_pago(request):
     })
 
 def boletos_disponibles(destino_id):
-    return Boleto.objects.filter(destino_id=destino_id, estado='libre').count()
+    return inventario.disponibles_destino(destino_id)
 
 
 
@@ -477,6 +473,40 @@ def crear_horario(request):
         'rol': rol_usuario,
     })
 
+@login_required
+def generar_horarios(request):
+    rol_usuario = request.user.rol
+
+    if rol_usuario not in ['empleado', 'admin']:
+        return render(request, 'users/error_403.html', status=403)
+
+    resumen = None
+    if request.method == 'POST':
+        form = HorarioRecurrenteForm(request.POST)
+        if form.is_valid():
+            datos = form.cleaned_data
+            resumen = generador_horarios.generar_recurrentes(
+                destinos=list(datos['destinos']),
+                dias_semana=datos['dias'],
+                horas=[datos['hora']],
+                desde=datos['desde'],
+                hasta=datos['hasta'],
+                capacidad_general=datos['capacidad_general'],
+                capacidad_vip=datos['capacidad_vip'],
+                boletos_perezosos=datos['boletos_perezosos'],
+                dry_run=datos['dry_run'],
+            )
+            resumen['dry_run'] = datos['dry_run']
+            resumen['milisegundos'] = sum(resumen['tiempos'].values()) * 1000
+    else:
+        form = HorarioRecurrenteForm()
+
+    return render(request, 'users/generar_horarios.html', {
+        'form': form,
+        'rol': rol_usuario,
+        'resumen': resumen,
+    })
+
 @login_required
 def listar_horarios(request):
     rol_usuario = request.user.rol
@@ -494,12 +524,19 @@ def listar_horarios(request):
 def error_403(request):
     return render(request, 'users/error_403.html')
 
+
+@require_http_methods(['GET', 'HEAD'])
+def servir_medio(request, nombre):
+    # Sin permiso se responde 404 para no revelar qué comprobantes existen
+    nombre = medios.limpio(nombre)
+    if nombre is None or not medios.puede_ver(request.user, nombre):
+        raise Http404
+    return medios.respuesta(request, nombre)
+
 @login_required
 def detalle_destino(request, destino_id):
     destino = get_object_or_404(Destino, id=destino_id)
-    horarios = Horario.objects.filter(destino=destino).prefetch_related(
-        Prefetch('boletos', queryset=Boleto.objects.filter(estado='libre'))
-    )
+    horarios = Horario.objects.filter(destino=destino)
 
     if request.method == "POST":
         try:
@@ -511,40 +548,24 @@ def detalle_destino(request, destino_id):
                 raise ValueError("La cantidad debe ser al menos 1")
 
             horario = get_object_or_404(Horario, id=horario_id, destino=destino)
-            
-
-            boletos_disponibles = list(Boleto.objects.filter(
-                destino=destino,
-                horario=horario,
-                tipo=tipo_boleto,
-                estado='libre'
-            )[:cantidad])
 
-            if len(boletos_disponibles) < cantidad:
+            libres = inventario.disponibles(horario, tipo_boleto)
+            if libres < cantidad:
                 messages.error(request, 
                     f"No hay suficientes boletos {tipo_boleto}. "
-                    f"Disponibles: {len(boletos_disponibles)}, "
+                    f"Disponibles: {libres}, "
                     f"Se solicitaron: {cantidad}"
                 )
                 return redirect('detalle_destino', destino_id=destino.id)
 
-            carrito, created = CarritoBoletos.objects.get_or_create(
-                usuario=request.user,
-                destino=destino,
-                horario=horario,
-                defaults={'cantidad': cantidad}
-            )
-            
-            if not created:
-                carrito.cantidad += cantidad
-                carrito.save()
-
-            for boleto in boletos_disponibles:
-                boleto.estado = 'carrito'
-                boleto.save()
-                carrito.boletos.add(boleto)
-
-            carrito.actualizar_total()
+            with transaction.atomic():
+                carrito, created = CarritoBoletos.objects.get_or_create(
+                    usuario=request.user,
+                    destino=destino,
+                    horario=horario,
+                    defaults={'cantidad': 0}
+                )
+                inventario.reclamar(carrito, cantidad, tipo_boleto)
             messages.success(request, f"✅ {cantidad} boleto(s) {tipo_boleto} agregados al carrito")
             return redirect('ver_carrito')
 
@@ -585,14 +606,16 @@ def gestionar_pagos(request):
                 pago.estado = 'aprobado'
                 pago.fecha_verificacion = timezone.now()
                 pago.save()
+                registrar('pago.aprobado', pago=pago.pk, usuario=pago.usuario_id, monto=pago.monto)
 
-                venta = procesar_compra(pago.usuario)
+                venta = procesar_compra(pago.usuario, base_url=request.build_absolute_uri('/'))
                 messages.success(request, f'Pago aprobado y compra confirmada por ${venta.total_pagado:.2f}.')
 
             elif accion == 'rechazar':
                 pago.estado = 'rechazado'
                 pago.fecha_verificacion = timezone.now()
                 pago.save()
+                registrar('pago.rechazado', pago=pago.pk, usuario=pago.usuario_id, monto=pago.monto)
                 messages.info(request, 'Pago rechazado.')
 
             return redirect('gestionar_pagos')
@@ -609,71 +632,30 @@ def gestionar_pagos(request):
 @login_required
 def historial_ventas(request):
     if request.user.rol == 'admin':
-        ventas = Ventas.objects.all().prefetch_related('boletos', 'paquetes').order_by('-fecha_compra')
+        ventas = Ventas.objects.all()
     else:
-        ventas = Ventas.objects.filter(usuario=request.user).prefetch_related('boletos', 'paquetes').order_by('-fecha_compra')
+        ventas = Ventas.objects.filter(usuario=request.user)
+    ventas = ventas.select_related('destino', 'usuario').con_conteos()
 
     query = request.GET.get('q', '')
     tipo = request.GET.get('tipo', '')
 
     if query:
-        ventas = ventas.filter(
-            Q(fecha_compra__icontains=query) |
-            Q(destino__nombre__icontains=query) |
-            Q(cantidad__icontains=query) |
-            Q(total_pagado__icontains=query) |
-            Q(hora__icontains=query) |
-            Q(usuario__nombre__icontains=query) |
-            Q(usuario__cedula__icontains=query)
-        )
+        ventas = busqueda.filtrar(ventas, query)
 
     if tipo:
-        if tipo == 'boletos':
-            ventas = ventas.filter(boletos__isnull=False, paquetes__isnull=True)
-        elif tipo == 'paquetes':
-            ventas = ventas.filter(paquetes__isnull=False, boletos__isnull=True)
-        elif tipo == 'mixta':
-            ventas = ventas.filter(boletos__isnull=False, paquetes__isnull=False)
-
-
-    paginator = Paginator(ventas, 10)
-    page = request.GET.get('page')
-
-    try:
-        ventas_paginator = paginator.page(page)
-    except PageNotAnInteger:
-        ventas_paginator = paginator.page(1)
-    except EmptyPage:
-        ventas_paginator = paginator.page(paginator.num_pages)
-
-
-    total_boletos = 0
-    total_paquetes = 0
-    ventas_mixtas = 0
-
-    for venta in ventas_paginator:
-        num_boletos = venta.boletos.count()
-        num_paquetes = venta.paquetes.count()
-        total_boletos += num_boletos
-        total_paquetes += num_paquetes
-
-        if num_boletos > 0 and num_paquetes > 0:
-            ventas_mixtas += 1
+        ventas = ventas.de_tipo(tipo)
 
 
-    ventas_total = Ventas.objects.all().prefetch_related('boletos', 'paquetes')
-    total_boletos_general = 0
-    total_paquetes_general = 0
-    ventas_mixtas_general = 0
+    ventas_paginator = paginacion.paginar(
+        ventas, ['-fecha_compra', '-id'], request.GET.get('cursor'), 10
+    )
 
-    for venta in ventas_total:
-        num_boletos = venta.boletos.count()
-        num_paquetes = venta.paquetes.count()
-        total_boletos_general += num_boletos
-        total_paquetes_general += num_paquetes
+    total_boletos = sum(venta.num_boletos for venta in ventas_paginator)
+    total_paquetes = sum(venta.num_paquetes for venta in ventas_paginator)
+    ventas_mixtas = sum(1 for venta in ventas_paginator if venta.num_boletos and venta.num_paquetes)
 
-        if num_boletos > 0 and num_paquetes > 0:
-            ventas_mixtas_general += 1
+    totales = reportes.kpis()
 
     return render(request, 'users/historial_ventas.html', {
         'ventas': ventas_paginator,
@@ -684,13 +666,37 @@ def historial_ventas(request):
         'tipo': tipo,
 
 
-        'total_boletos_general': total_boletos_general,
-        'total_paquetes_general': total_paquetes_general,
-        'ventas_mixtas_general': ventas_mixtas_general,
-        'ventas_total_count': ventas_total.count(),
+        'total_boletos_general': totales['boletos'],
+        'total_paquetes_general': totales['paquetes'],
+        'ventas_mixtas_general': totales['mixtas'],
+        'ventas_total_count': totales['ventas'],
     })
 
 
+@login_required
+def exportar_facturas(request):
+    if request.user.rol != 'admin':
+        return HttpResponseForbidden("No tienes permisos para acceder a esta página.")
+
+    try:
+        desde = datetime.date.fromisoformat(request.GET.get('desde', ''))
+        hasta = datetime.date.fromisoformat(request.GET.get('hasta', ''))
+    except ValueError:
+        messages.error(request, "Indica un rango de fechas válido para exportar las facturas.")
+        return redirect('historial_ventas')
+    if hasta < desde:
+        messages.error(request, "La fecha final debe ser posterior a la inicial.")
+        return redirect('historial_ventas')
+
+    ventas = Ventas.objects.filter(fecha_compra__date__range=(desde, hasta))
+    response = StreamingHttpResponse(
+        facturas.exportar_zip(ventas, request.build_absolute_uri('/')),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename=facturas_{desde}_{hasta}.zip'
+    return response
+
+
 @login_required
 def factura(request, venta_id):
     venta = get_object_or_404(Ventas, id=venta_id, usuario=request.user)
@@ -783,11 +789,13 @@ def verificar_datos(request):
         telefono = data.get('telefono')
         email = data.get('email')
 
-        existe = Usuario.objects.filter(cedula=cedula).exists() or \
-                 Usuario.objects.filter(telefono=telefono).exists() or \
-                 Usuario.objects.filter(email=email).exists()
+        campos = unicidad.ocupados(cedula=cedula, telefono=telefono, email=email, usar_cache=True)
 
-        return JsonResponse({'existe': existe})
+        return JsonResponse({
+            'existe': bool(campos),
+            'campos': [campo for campo in unicidad.CAMPOS if campo in campos],
+            'mensajes': [unicidad.MENSAJES[campo] for campo in unicidad.CAMPOS if campo in campos],
+        })
 
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
@@ -851,9 +859,10 @@ def verificar_pago(request, pago_id):
     pago.estado = 'verificado'
     pago.fecha_verificacion = timezone.now()
     pago.save()
+    registrar('pago.verificado', pago=pago.pk, usuario=pago.usuario_id, monto=pago.monto)
 
 
-    total = procesar_compra(pago.usuario)
+    total = procesar_compra(pago.usuario, base_url=request.build_absolute_uri('/'))
 
     messages.success(request, f'Pago verificado y compra registrada para {pago.usuario.email}')
     return redirect('panel_pagos')
@@ -865,69 +874,17 @@ def estado_pago(request):
 
 
 
-def procesar_compra(usuario):
-    carritos_boletos = CarritoBoletos.objects.filter(usuario=usuario)
-    carritos_paquetes = CarritoPaquetes.objects.filter(usuario=usuario)
-
-    total = Decimal('0')
-    boletos_finales = []
-    paquetes_finales = []
-
-
-    destino = (
-        carritos_boletos.first().destino if carritos_boletos.exists()
-        else carritos_paquetes.first().destino if carritos_paquetes.exists()
-        else None
-    )
-
-
-    for carrito in carritos_boletos:
-        boletos = list(carrito.boletos.all())
-        for boleto in boletos:
-            boleto.estado = 'vendido'
-            boleto.usuario = usuario
-            boleto.save()
-            boletos_finales.append(boleto)
-            total += boleto.precio
-        carrito.delete()
-
-
-    for carrito in carritos_paquetes:
-        paquetes = list(carrito.paquetes.all())
-        for paquete in paquetes:
-            paquete.estado = 'vendido'
-            paquete.save()
-            paquetes_finales.append(paquete)
-            total += paquete.precio_envio
-        carrito.delete()
-
-
-    if not boletos_finales and not paquetes_finales:
-        raise ValueError("No hay productos para procesar.")
-
-    venta = Ventas.objects.create(
-        usuario=usuario,
-        destino=destino,
-        cantidad=len(boletos_finales) + len(paquetes_finales),
-        hora=timezone.now().time(),
-        total_pagado=total,
-    )
-
-    if boletos_finales:
-        venta.boletos.set(boletos_finales)
-    if paquetes_finales:
-        venta.paquetes.set(paquetes_finales)
-
-    return venta
-
 @login_required
+@transaction.atomic
 def vaciar_carrito(request):
   
     carritos_boletos = CarritoBoletos.objects.filter(usuario=request.user)
     for carrito in carritos_boletos:
-        for boleto in carrito.boletos.all():
+        boletos = list(carrito.boletos.all())
+        for boleto in boletos:
             boleto.estado = 'libre'
             boleto.save()
+        inventario.mover(boletos, 'carrito', 'libre')
         carrito.delete()
 
 
@@ -944,47 +901,68 @@ def vaciar_carrito(request):
 
 
 
+def _descargar_factura(request, venta_id, huella):
+    etag = f'"{huella}"'
+    no_modificada = get_conditional_response(request, etag=etag)
+    if no_modificada is not None:
+        no_modificada['ETag'] = etag
+        return no_modificada
+
+    response = FileResponse(
+        open(facturas.ruta(venta_id, huella), 'rb'),
+        as_attachment=True,
+        filename=f'factura_{venta_id}.pdf',
+        content_type='application/pdf',
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _estado_factura(venta_id, huella, estado):
+    datos = {
+        'trabajo': facturas.trabajo(venta_id, huella),
+        'estado': estado or 'desconocido',
+        'estado_url': reverse('factura_pdf_estado', args=[venta_id, huella]),
+    }
+    if estado == 'lista':
+        datos['descarga_url'] = reverse('factura_pdf_descargar', args=[venta_id, huella])
+    return datos
+
+
 @login_required
 def factura_pdf(request, venta_id):
-    venta = get_object_or_404(Ventas, id=venta_id)
+    venta = get_object_or_404(Ventas.objects.select_related('destino', 'usuario'), id=venta_id)
 
-    items = []
+    html_string = facturas.html_factura(venta)
+    huella = facturas.huella(html_string)
+    estado = facturas.estado(venta.id, huella)
+    if estado != 'lista':
+        # La conversión a PDF no ocupa al worker: se encola y se consulta después
+        _, estado = facturas.encolar(venta, html_string, request.build_absolute_uri('/'))
 
-    for boleto in venta.boletos.all():
-        items.append({
-            'cantidad': 1,
-            'tipo': 'boleto',
-            'descripcion': f"Boleto a {venta.destino.nombre if venta.destino else 'Destino no especificado'}",
-            'detalle': f"Horario: {venta.hora.strftime('%H:%M')}",
-            'precio': boleto.precio
-        })
+    if estado == 'lista':
+        return _descargar_factura(request, venta.id, huella)
 
-    for paquete in venta.paquetes.all():
-        items.append({
-            'cantidad': 1,
-            'tipo': 'paquete',
-            'descripcion': f"Paquete hacia {venta.destino.nombre if venta.destino else 'Destino no especificado'}",
-            'detalle': f"Peso: {paquete.peso} kg",
-            'precio': paquete.precio_envio
-        })
+    datos = _estado_factura(venta.id, huella, estado)
+    # Con error no se reintenta enseguida: se informa en lugar de volver a esperar
+    status = 500 if estado == 'error' else 202
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(datos, status=status)
+    return render(request, 'users/factura_generando.html', {'venta': venta, **datos}, status=status)
 
-    html_string = render_to_string('users/factura_template.html', {
-        'venta': venta,
-        'usuario': venta.usuario,
-        'cliente': venta.usuario,  
-        'items': items,
-        'total': venta.total_pagado,
-    })
-
-    html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
-    result = html.write_pdf()
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename=factura_{venta.id}.pdf'
+@login_required
+def factura_pdf_estado(request, venta_id, huella):
+    estado = facturas.estado(venta_id, huella)
+    return JsonResponse(_estado_factura(venta_id, huella, estado), status=200 if estado else 404)
 
-    response.write(result)
 
-    return response
+@login_required
+def factura_pdf_descargar(request, venta_id, huella):
+    if facturas.estado(venta_id, huella) != 'lista':
+        raise Http404("La factura todavía no está generada.")
+    return _descargar_factura(request, venta_id, huella)
 
 
 
@@ -1022,7 +1000,9 @@ def ver_carrito(request):
         for paquete in carrito.paquetes.all():
             paquetes.append(paquete)
     
-    request.session['total_carrito'] = float(total)
+    # Asignar el mismo total marcaría la sesión como modificada en cada visita
+    if request.session.get('total_carrito') != float(total):
+        request.session['total_carrito'] = float(total)
     
     return render(request, 'users/ver_carrito.html', {
         'carrito_items': carrito_items,  
@@ -1071,100 +1051,52 @@ def agregar_al_carrito(request, destino_id):
         messages.error(request, "No hay suficientes boletos disponibles.")
         return redirect('listar_boletos')
 
-
-    boletos_libres = Boleto.objects.filter(
-        destino=destino, 
-        horario=horario,
-        estado='libre'
-    )[:cantidad]
-
-    if boletos_libres.count() < cantidad:
+    if inventario.disponibles(horario) < cantidad:
         messages.error(request, "No hay suficientes boletos disponibles para este horario.")
         return redirect('detalle_destino', destino_id=destino.id)
 
-
-    carrito, created = CarritoBoletos.objects.get_or_create(
-        usuario=request.user,
-        destino=destino,
-        horario=horario,
-        defaults={'cantidad': cantidad}
-    )
-    
-    if not created:
-        carrito.cantidad += cantidad
-        carrito.save()
-
-
-    for boleto in boletos_libres:
-        boleto.estado = 'carrito'
-        boleto.save()
-        carrito.boletos.add(boleto)
-
-    carrito.actualizar_total()
+    try:
+        with transaction.atomic():
+            carrito, created = CarritoBoletos.objects.get_or_create(
+                usuario=request.user,
+                destino=destino,
+                horario=horario,
+                defaults={'cantidad': 0}
+            )
+            inventario.reclamar(carrito, cantidad)
+    except inventario.BoletosInsuficientes:
+        messages.error(request, "No hay suficientes boletos disponibles para este horario.")
+        return redirect('detalle_destino', destino_id=destino.id)
     messages.success(request, "Boleto(s) agregado(s) al carrito.")
     return redirect('ver_carrito')
 
 
 @login_required
 def confirmar_compra(request):
+    # Mismo cierre que el pago: una venta indexada para la búsqueda y sumada al resumen diario
+    try:
+        venta = procesar_compra(request.user, base_url=request.build_absolute_uri('/'))
+    except ValueError:
+        messages.warning(request, 'Tu carrito está vacío.')
+        return redirect('ver_carrito')
 
-    carritos_boletos = CarritoBoletos.objects.filter(usuario=request.user)
-    total = Decimal('0')
-    
-    for carrito in carritos_boletos:
-        boletos = carrito.boletos.all()
-        subtotal = Decimal('0')
-        
-        for boleto in boletos:
-            subtotal += boleto.precio
-            boleto.estado = 'vendido'
-            boleto.usuario = request.user
-            boleto.save()
-
-        Ventas.objects.create(
-            usuario=request.user,
-            destino=carrito.destino,
-            cantidad=carrito.cantidad,
-            hora=carrito.horario.hora,
-            total_pagado=subtotal,
-        )
-        total += subtotal
-        carrito.delete()
-
-
-    carritos_paquetes = CarritoPaquetes.objects.filter(usuario=request.user)
-    
-    for carrito in carritos_paquetes:
-        for paquete in carrito.paquetes.all():
-            paquete.estado = 'vendido'
-            paquete.save()
-            
-            Ventas.objects.create(
-                usuario=request.user,
-                destino=carrito.destino,
-                cantidad=1,
-                hora=timezone.now().time(),
-                total_pagado=paquete.precio_envio,
-                paquete=paquete
-            )
-            total += paquete.precio_envio
-        carrito.delete()
-
-    request.session['total_compra'] = str(total)
-    messages.success(request, f"Compra confirmada. Total a pagar: ${total:.2f}")
-    return redirect('realizar_pago')
+    messages.success(request, f"Compra confirmada. Total a pagar: ${venta.total_pagado:.2f}")
+    return redirect('factura', venta_id=venta.id)
 
 
 
 @login_required
+@transaction.atomic
 def eliminar_boleto_carrito(request, carrito_id):
     carrito = get_object_or_404(CarritoBoletos, id=carrito_id, usuario=request.user)
     
 
-    for boleto in carrito.boletos.all():
+    boletos = list(carrito.boletos.all())
+    for boleto in boletos:
         boleto.estado = 'libre'
         boleto.save()
-    
+    inventario.mover(boletos, 'carrito', 'libre')
+
     carrito.delete()
     messages.success(request, "Boletos eliminados del carrito.")
     return redirect('ver_carrito')